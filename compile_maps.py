@@ -0,0 +1,330 @@
+"""
+Offline map compiler
+
+Resolves tileset/image paths, flattens Tiled infinite (chunked) maps,
+validates layers and objects, and writes the compiled map files
+(map/.cache/<name>.npz) that GameMap loads at startup.
+
+Usage:
+    python compile_maps.py                  # every map/*.tmx
+    python compile_maps.py map/boss_2.tmx   # selected maps
+"""
+import base64
+import gzip
+import os
+import re
+import sys
+import time
+import zlib
+import xml.etree.ElementTree as ET
+
+# Tile surfaces are converted for the display format, so a (dummy) display is needed
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import numpy as np
+import pygame
+import pytmx
+
+import game
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+MAP_DIR = os.path.join(SCRIPT_DIR, 'map')
+IMAGE_DIR = os.path.join(SCRIPT_DIR, 'image')
+
+
+class MapReport:
+    """Collects what happened while compiling one map"""
+
+    def __init__(self, tmx_file):
+        self.tmx_file = tmx_file
+        self.fixes = []
+        self.warnings = []
+        self.errors = []
+        self.parse_ms = None
+        self.compiled_ms = None
+
+    def print(self):
+        name = os.path.basename(self.tmx_file)
+        status = "FAILED" if self.errors else "ok"
+        print(f"\n{name}: {status}")
+        for fix in self.fixes:
+            print(f"  fixed:   {fix}")
+        for warning in self.warnings:
+            print(f"  warning: {warning}")
+        for error in self.errors:
+            print(f"  error:   {error}")
+        if self.parse_ms is not None and self.compiled_ms is not None:
+            print(f"  load time: {self.parse_ms:.1f} ms from TMX -> "
+                  f"{self.compiled_ms:.1f} ms compiled "
+                  f"({self.parse_ms / max(self.compiled_ms, 0.001):.1f}x)")
+
+
+def resolve_path(source, base_dir, search_dirs, expected_size=None):
+    """Find a referenced file; fall back to its bare file name in search_dirs.
+
+    Handles paths saved on another machine, e.g. 'c:\\Users\\...\\map\\boss_2.gif'.
+    For images, expected_size (the width/height declared in the TMX/TSX) picks
+    the right file when several candidates exist, e.g. a placeholder left next to
+    the map by the old runtime auto-fix."""
+    name = re.split(r'[\\/]', source)[-1]
+    candidates = [os.path.normpath(os.path.join(base_dir, source))]
+    candidates += [os.path.normpath(os.path.join(d, name)) for d in search_dirs]
+    found = [c for c in dict.fromkeys(candidates) if os.path.exists(c)]
+    if expected_size:
+        for candidate in found:
+            try:
+                if pygame.image.load(candidate).get_size() == expected_size:
+                    return candidate
+            except pygame.error:
+                pass
+    return found[0] if found else None
+
+
+def decode_gids(element, encoding, compression):
+    """Gids stored in a <data> or <chunk> element, in row order"""
+    if encoding == 'csv':
+        return [int(v) for v in element.text.replace('\n', '').split(',') if v.strip()]
+    if encoding == 'base64':
+        raw = base64.b64decode(element.text.strip())
+        if compression == 'zlib':
+            raw = zlib.decompress(raw)
+        elif compression == 'gzip':
+            raw = gzip.decompress(raw)
+        elif compression:
+            raise ValueError(f"unsupported layer compression '{compression}'")
+        return np.frombuffer(raw, dtype='<u4').tolist()
+    return [int(tile.get('gid', 0)) for tile in element.findall('tile')]
+
+
+def flatten_infinite(root, report):
+    """Rewrite an infinite map's chunked layers as one finite map, in place.
+
+    pytmx cannot read chunked layers. The map is cropped to the bounding box of
+    all chunks, and objects are moved by the same offset so they stay on their tiles."""
+    tile_w = int(root.get('tilewidth'))
+    tile_h = int(root.get('tileheight'))
+    layers = []
+    for layer in root.iter('layer'):
+        data = layer.find('data')
+        chunks = []
+        for chunk in data.findall('chunk'):
+            x, y, w, h = (int(chunk.get(key)) for key in ('x', 'y', 'width', 'height'))
+            gids = decode_gids(chunk, data.get('encoding'), data.get('compression'))
+            chunks.append((x, y, w, h, gids))
+        layers.append((layer, data, chunks))
+
+    all_chunks = [chunk for _, _, chunks in layers for chunk in chunks]
+    if not all_chunks:
+        report.errors.append("infinite map has no tile chunks")
+        return
+    x0 = min(x for x, _, _, _, _ in all_chunks)
+    y0 = min(y for _, y, _, _, _ in all_chunks)
+    width = max(x + w for x, _, w, _, _ in all_chunks) - x0
+    height = max(y + h for _, y, _, h, _ in all_chunks) - y0
+
+    for layer, data, chunks in layers:
+        grid = np.zeros((height, width), dtype=np.uint32)
+        for x, y, w, h, gids in chunks:
+            grid[y - y0:y - y0 + h, x - x0:x - x0 + w] = np.array(gids, dtype=np.uint32).reshape(h, w)
+        layer.set('width', str(width))
+        layer.set('height', str(height))
+        tail = data.tail
+        data.clear()
+        data.set('encoding', 'csv')
+        data.text = '\n' + ',\n'.join(','.join(map(str, row)) for row in grid.tolist()) + '\n'
+        data.tail = tail
+
+    # Only the map's object layers (also inside group layers) move; tile collision
+    # objects of embedded tilesets are in tile coordinates
+    def map_objects(parent):
+        for child in parent:
+            if child.tag == 'objectgroup':
+                yield from child.findall('object')
+            elif child.tag == 'group':
+                yield from map_objects(child)
+
+    for obj in map_objects(root):
+        obj.set('x', str(float(obj.get('x', 0)) - x0 * tile_w))
+        obj.set('y', str(float(obj.get('y', 0)) - y0 * tile_h))
+    root.set('infinite', '0')
+    root.set('width', str(width))
+    root.set('height', str(height))
+    report.fixes.append(f"infinite map flattened to {width}x{height} tiles "
+                        f"(tile {x0},{y0} is the new origin)")
+
+
+def resolve_tilesets(tmx_file, report):
+    """Return a TMX path pytmx can load.
+
+    If any tileset or image reference is broken but can be found locally, or the
+    map is infinite, a copy of the TMX (and of the affected TSX files) with
+    absolute, resolved paths and finite layers is written under
+    map/.cache/resolved. The original files are never modified."""
+    tmx_dir = os.path.dirname(os.path.abspath(tmx_file))
+    resolved_dir = os.path.join(tmx_dir, game.MAP_CACHE_DIR_NAME, 'resolved')
+    search_dirs = [tmx_dir, IMAGE_DIR]
+
+    def resolve_images(root, base_dir, owner):
+        """Make every <image source> absolute; returns True if one had to be repaired"""
+        repaired = False
+        for image in root.iter('image'):
+            source = image.get('source')
+            if not source:
+                continue
+            try:
+                expected_size = (int(image.get('width')), int(image.get('height')))
+            except (TypeError, ValueError):
+                expected_size = None
+            resolved = resolve_path(source, base_dir, search_dirs, expected_size)
+            if resolved is None:
+                report.errors.append(f"{owner}: image not found: {source}")
+                continue
+            if resolved != os.path.normpath(os.path.join(base_dir, source)):
+                report.fixes.append(f"{owner}: {source} -> {os.path.relpath(resolved, tmx_dir)}")
+                repaired = True
+            image.set('source', resolved)
+        return repaired
+
+    tree = ET.parse(tmx_file)
+    root = tree.getroot()
+    tsx_copies = []
+    repaired = resolve_images(root, tmx_dir, os.path.basename(tmx_file))
+    if root.get('infinite') == '1':
+        try:
+            flatten_infinite(root, report)
+        except (ValueError, TypeError, zlib.error) as e:
+            report.errors.append(f"could not read infinite map chunks: {e}")
+        repaired = True
+
+    for tileset in root.findall('tileset'):
+        source = tileset.get('source')
+        if not source:
+            continue
+        tsx_file = resolve_path(source, tmx_dir, search_dirs)
+        if tsx_file is None:
+            report.errors.append(f"tileset not found: {source}")
+            continue
+        if tsx_file != os.path.normpath(os.path.join(tmx_dir, source)):
+            report.fixes.append(f"tileset {source} -> {os.path.relpath(tsx_file, tmx_dir)}")
+            repaired = True
+
+        ts_tree = ET.parse(tsx_file)
+        if resolve_images(ts_tree.getroot(), os.path.dirname(tsx_file), os.path.basename(tsx_file)):
+            repaired = True
+            tsx_file = os.path.join(resolved_dir, os.path.basename(tsx_file))
+            tsx_copies.append((ts_tree, tsx_file))
+        tileset.set('source', tsx_file)
+
+    if not repaired:
+        return tmx_file
+
+    os.makedirs(resolved_dir, exist_ok=True)
+    for ts_tree, tsx_file in tsx_copies:
+        ts_tree.write(tsx_file, encoding='utf-8', xml_declaration=True)
+    resolved_tmx = os.path.join(resolved_dir, os.path.basename(tmx_file))
+    tree.write(resolved_tmx, encoding='utf-8', xml_declaration=True)
+    return resolved_tmx
+
+
+def validate(tmx_data, compiled, tmx_file, report):
+    """Check layers and objects for problems the game would only hit at runtime"""
+    width, height = compiled['width'], compiled['height']
+    map_w = width * compiled['tile_w']
+    map_h = height * compiled['tile_h']
+
+    for layer in tmx_data.layers:
+        if isinstance(layer, pytmx.TiledTileLayer) and (layer.width, layer.height) != (width, height):
+            report.errors.append(
+                f"layer '{layer.name}' is {layer.width}x{layer.height}, map is {width}x{height}")
+    if not compiled['layers']:
+        report.errors.append("no visible tile layers")
+    if not compiled['collision'].any():
+        report.warnings.append("no blocked tiles (add a layer with the 'blocked' property)")
+
+    missing = sum(int(((gids > 0) & (compiled['image_index'][gids] < 0)).sum())
+                  for gids in compiled['layers'])
+    if missing:
+        report.warnings.append(f"{missing} placed tiles have no image")
+
+    tmx_dir = os.path.dirname(os.path.abspath(tmx_file))
+    for record in compiled['objects']:
+        obj_type = str(record.get('type') or record.get('name') or '').lower()
+        label = f"object {record.get('id')} ({obj_type or 'untyped'})"
+        x, y = record.get('x') or 0, record.get('y') or 0
+        if not (0 <= x < map_w and 0 <= y < map_h):
+            report.warnings.append(f"{label} at ({x:.0f}, {y:.0f}) is outside the map")
+
+        if obj_type == 'teleport':
+            props = record.get('properties') or {}
+            dest = props.get('dest') or props.get('map') or props.get('destination')
+            if not dest:
+                report.errors.append(f"{label} has no 'dest' property")
+            elif resolve_path(dest, tmx_dir, [MAP_DIR]) is None:
+                report.errors.append(f"{label} points to missing map {dest}")
+
+
+def compile_map(tmx_file):
+    report = MapReport(tmx_file)
+    try:
+        parse_file = resolve_tilesets(tmx_file, report)
+    except ET.ParseError as e:
+        report.errors.append(f"invalid XML: {e}")
+        return report
+    if report.errors:
+        return report
+
+    try:
+        # Both load times are measured cold, without tilesets decoded for earlier maps
+        game.TILESET_CACHE.clear()
+        start = time.perf_counter()
+        tmx_data = game.load_tmx(parse_file)
+        compiled = game.compile_tmx(tmx_data, tmx_file)
+        report.parse_ms = (time.perf_counter() - start) * 1000
+    except Exception as e:
+        report.errors.append(f"pytmx could not load the map: {e}")
+        return report
+
+    validate(tmx_data, compiled, tmx_file, report)
+    if report.errors:
+        return report
+    if not compiled['cacheable']:
+        report.errors.append("some tile images have no known source")
+        return report
+
+    game.save_compiled_map(tmx_file, compiled)
+
+    game.TILESET_CACHE.clear()
+    start = time.perf_counter()
+    reloaded = game.load_compiled_map(tmx_file)
+    if reloaded is None:
+        report.errors.append("compiled map could not be read back")
+        return report
+    game.load_compiled_tile_images(tmx_file, reloaded)
+    report.compiled_ms = (time.perf_counter() - start) * 1000
+    return report
+
+
+def main(args):
+    if args:
+        tmx_files = args
+    else:
+        # *_fixed.tmx files are leftovers of the old runtime auto-fix
+        tmx_files = sorted(
+            os.path.join(MAP_DIR, name) for name in os.listdir(MAP_DIR)
+            if name.endswith('.tmx') and not name.endswith('_fixed.tmx'))
+
+    pygame.init()
+    pygame.display.set_mode((1, 1))
+
+    reports = [compile_map(tmx_file) for tmx_file in tmx_files]
+    for report in reports:
+        report.print()
+
+    failed = [r for r in reports if r.errors]
+    print(f"\nCompiled {len(reports) - len(failed)}/{len(reports)} maps.")
+    pygame.quit()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
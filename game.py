@@ -1,11 +1,236 @@
 import pygame
 import pytmx
-from pytmx.util_pygame import load_pygame
+from pytmx.util_pygame import handle_transformation, smart_convert
 import os
 import sys
 import random
 import math
+import re
+import json
+import bisect
+import hashlib
+import queue
+import threading
+import weakref
+from collections import OrderedDict
 from enum import Enum
+import numpy as np
+
+# Static tile layers are pre-rendered into square chunks of this many tiles
+TILE_CHUNK_SIZE = 16
+# Maps with more tiles than this stream their chunks instead of pre-rendering them all
+STREAM_MAP_MIN_TILES = 256 * 256
+# Streaming mode keeps chunks within this many tiles of the player resident
+STREAM_RADIUS_TILES = 48
+# New chunks rendered ahead of the player per frame (visible ones are always rendered)
+STREAM_CHUNKS_PER_FRAME = 2
+# Footprints (in tiles) whose free positions are tabulated at load: slimes, towers
+SPAWN_FOOTPRINTS = ((2, 2), (3, 3))
+# Without spawn zones, random spawns keep this many tiles away from the map edge
+SPAWN_MARGIN_TILES = 5
+# How far (path length in pixels) the slime flow field reaches from the player
+FLOW_FIELD_RANGE = 400
+# Orthogonal steps first so straight paths win ties
+FLOW_NEIGHBOURS = ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (-1, 1), (1, -1), (-1, -1))
+# Line-of-sight results kept per map, keyed by (source tile, target tile)
+LOS_CACHE_SIZE = 4096
+# Trigger zones (teleports, NPC talk ranges) are indexed in grid buckets of this many pixels
+TRIGGER_BUCKET_SIZE = 256
+
+# Compiled maps live in <map dir>/.cache/<name>.npz; bump the version when the format changes
+MAP_CACHE_VERSION = 4
+MAP_CACHE_DIR_NAME = '.cache'
+# How a compiled tile Surface is converted after slicing it from its tileset
+TILE_MODE_OPAQUE = 0
+TILE_MODE_ALPHA = 1
+TILE_MODE_COLORKEY = 2
+# Camera zoom levels cycled with +/-; map chunks and sprites are pre-scaled per level
+ZOOM_LEVELS = (0.5, 1, 2, 3)
+# Byte budget for one map's zoomed chunk surfaces (least recently drawn go first)
+ZOOM_CHUNK_CACHE_BYTES = 96 * 1024 * 1024
+# Zoomed chunk pixels scaled per frame (~5 ms) after a zoom change; the rest of the
+# view is drawn from scaled tiles until their chunks are ready
+ZOOM_SCALE_PIXELS_PER_FRAME = 2500 * 1000
+
+# Fog of war: tiles this close to the player (in tiles) become explored
+FOG_REVEAL_RADIUS = 7
+FOG_REVEAL_MASK = np.add.outer(np.arange(-FOG_REVEAL_RADIUS, FOG_REVEAL_RADIUS + 1) ** 2,
+                               np.arange(-FOG_REVEAL_RADIUS, FOG_REVEAL_RADIUS + 1) ** 2) \
+    <= FOG_REVEAL_RADIUS ** 2
+# Opacity of the fog over unexplored tiles
+FOG_ALPHA = 225
+# Extra tiles the cached fog overlay covers around the view, so walking
+# only scrolls it every few tiles
+FOG_OVERLAY_MARGIN = 8
+
+# Lighting: maps with the 'boss_room' property or an 'ambient' colour property
+# are dark apart from their lights. Static lights go into a lightmap with one
+# texel per LIGHTMAP_SCALE world pixels; the part around the view is scaled to
+# the screen once per zoom, and moving lights are added onto it at screen resolution.
+BOSS_ROOM_AMBIENT = (60, 55, 80)
+LIGHTMAP_SCALE = 4
+# Bigger maps get no baked lightmap; their static lights are added to the scaled window
+LIGHTMAP_MAX_TEXELS = 2048 * 2048
+# Extra lightmap texels the scaled window covers around the view
+LIGHTMAP_WINDOW_MARGIN = 48
+# Texels scaled along on each side of a strip exposed by moving the window
+LIGHTMAP_STRIP_OVERLAP = 2
+# Light radii in world pixels
+PLAYER_LIGHT = (170, (255, 225, 180))
+TOWER_LIGHT_RADIUS = 140
+PROJECTILE_LIGHT_RADIUS = 56
+# Minimap: length of its longer side, and its distance from the top-right screen corner
+MINIMAP_SIZE = 180
+MINIMAP_MARGIN = 10
+
+LIGHT_COLOURS = {
+    'fire': (255, 140, 60),
+    'water': (80, 160, 255),
+    'void': (170, 80, 255),
+    'ice': (150, 210, 255),
+    'lightning': (255, 250, 140),
+    'holy': (255, 245, 200),
+    'default': (255, 210, 140),
+}
+
+
+# Source Surface -> {zoom: scaled copy}; entries go away together with their sprite
+SCALED_SPRITES = weakref.WeakKeyDictionary()
+
+
+def scaled_sprite(image, zoom):
+    """image scaled by zoom, made once per sprite and zoom level"""
+    if zoom == 1:
+        return image
+    sizes = SCALED_SPRITES.get(image)
+    if sizes is None:
+        sizes = SCALED_SPRITES[image] = {}
+    scaled = sizes.get(zoom)
+    if scaled is None:
+        size = (max(1, round(image.get_width() * zoom)),
+                max(1, round(image.get_height() * zoom)))
+        scaled = sizes[zoom] = pygame.transform.scale(image, size)
+    return scaled
+
+
+# Added onto a sprite's colour while it flashes after being hit
+HIT_FLASH_COLOUR = (255, 255, 255, 100)
+# Surface alpha of dead enemies
+DEAD_SPRITE_ALPHA = 100
+# Source Surface -> {(zoom, flipped, flashed, faded): variant}, like SCALED_SPRITES
+SPRITE_VARIANTS = weakref.WeakKeyDictionary()
+
+
+def sprite_variant(image, zoom=1, flipped=False, flashed=False, faded=False):
+    """scaled_sprite(image, zoom) mirrored, hit-flashed and/or faded out,
+    made once per sprite and combination"""
+    if not (flipped or flashed or faded):
+        return scaled_sprite(image, zoom)
+    variants = SPRITE_VARIANTS.get(image)
+    if variants is None:
+        variants = SPRITE_VARIANTS[image] = {}
+    key = (zoom, flipped, flashed, faded)
+    variant = variants.get(key)
+    if variant is None:
+        variant = scaled_sprite(image, zoom)
+        variant = pygame.transform.flip(variant, True, False) if flipped else variant.copy()
+        if flashed:
+            variant.fill(HIT_FLASH_COLOUR, special_flags=pygame.BLEND_RGB_ADD)
+        if faded:
+            variant.set_alpha(DEAD_SPRITE_ALPHA)
+        variants[key] = variant
+    return variant
+
+
+def prepare_sprite_variants(images, flipped=False, faded=False):
+    """Build the zoom 1 variants of images at load time, so the first hit
+    or turn doesn't have to"""
+    for image in images:
+        for flip in {False, flipped}:
+            for fade in {False, faded}:
+                for flash in (False, True):
+                    sprite_variant(image, 1, flip, flash, fade)
+
+
+# ('slime'/'tower'/'boss', type, width, height) -> frames or image loaded once and
+# shared by every enemy of that kind, so they also share their sprite variants
+ENEMY_SPRITES = {}
+# (size, colour, alpha) -> translucent filled Surface, e.g. name tag backgrounds
+BOXES = {}
+
+
+def translucent_box(size, colour, alpha):
+    """Surface of the given size filled with colour at the given alpha, made once"""
+    box = BOXES.get((size, colour, alpha))
+    if box is None:
+        box = BOXES[(size, colour, alpha)] = pygame.Surface(size)
+        box.set_alpha(alpha)
+        box.fill(colour)
+    return box
+
+
+# (font file, size) -> Font; every Font in the game comes from get_font
+FONTS = {}
+# (font file, size, text, colour, antialias) -> rendered Surface, least recently used first
+TEXT_CACHE = OrderedDict()
+TEXT_CACHE_SIZE = 512
+
+
+def get_font(size, name=None):
+    """Shared Font of the given file (None for pygame's default) and size"""
+    font = FONTS.get((name, size))
+    if font is None:
+        font = FONTS[(name, size)] = pygame.font.Font(name, size)
+    return font
+
+
+def render_text(text, size, colour, antialias=True, name=None):
+    """text rendered with get_font(size, name), cached; the Surface is shared, so don't modify it"""
+    key = (name, size, text, tuple(colour), antialias)
+    surface = TEXT_CACHE.get(key)
+    if surface is None:
+        surface = TEXT_CACHE[key] = get_font(size, name).render(text, antialias, colour)
+        if len(TEXT_CACHE) > TEXT_CACHE_SIZE:
+            TEXT_CACHE.popitem(last=False)
+    else:
+        TEXT_CACHE.move_to_end(key)
+    return surface
+
+
+# (radius in lightmap texels, colour) -> radial gradient Surface
+LIGHT_STAMPS = {}
+
+
+def light_stamp(radius, colour):
+    """Radial light gradient to add onto a lightmap or light buffer, made once per radius and colour"""
+    stamp = LIGHT_STAMPS.get((radius, colour))
+    if stamp is None:
+        distance = np.hypot(*np.ogrid[-radius:radius + 1, -radius:radius + 1]) / max(radius, 1)
+        falloff = np.clip(1 - distance, 0, 1) ** 2
+        pixels = (falloff[:, :, None] * np.array(colour)).astype(np.uint8)
+        stamp = LIGHT_STAMPS[(radius, colour)] = pygame.surfarray.make_surface(pixels).convert()
+    return stamp
+
+
+def add_lights(lightmap, lights, left, top):
+    """Add lights (x, y, radius, colour) in world pixels onto lightmap, whose
+    top-left texel is lightmap texel (left, top) of the world"""
+    s = LIGHTMAP_SCALE
+    lightmap.blits([(light_stamp(radius // s, colour),
+                     (int(x) // s - left - radius // s, int(y) // s - top - radius // s),
+                     None, pygame.BLEND_ADD)
+                    for x, y, radius, colour in lights], False)
+
+
+def parse_colour(value):
+    """(r, g, b) of a Tiled colour property ('#rrggbb' or '#aarrggbb'), or None"""
+    value = str(value or '').lstrip('#')
+    if len(value) not in (6, 8):
+        return None
+    try:
+        return (int(value[-6:-4], 16), int(value[-4:-2], 16), int(value[-2:], 16))
+    except ValueError:
+        return None
 
 
 class State(Enum):
@@ -24,6 +249,8 @@ class Projectile:
         self.is_enemy = is_enemy
         self.active = True
         self.projectile_type = projectile_type
+        # Set once the projectile has left the blocked tiles it may be fired from (e.g. a tower)
+        self.clear_of_walls = False
 
         dx = target_x - x
         dy = target_y - y
@@ -90,16 +317,16 @@ class Projectile:
         self.y += self.vel_y
         self.rect.center = (self.x, self.y)
 
-    def check_collision(self, collision_rects):
-        """Check if projectile hits a collision tile"""
-        for rect in collision_rects:
-            if self.rect.colliderect(rect):
-                return True
-        return False
+    def check_collision(self, game_map):
+        """Check if projectile hits a collision tile, ignoring the ones it was fired from"""
+        blocked = game_map.rect_blocked(pygame.Rect(int(self.x), int(self.y), 1, 1))
+        if not blocked:
+            self.clear_of_walls = True
+        return blocked and self.clear_of_walls
 
-    def draw(self, surface, camera_x, camera_y):
-        surface.blit(self.image, (self.x - camera_x -
-                     10, self.y - camera_y - 10))
+    def draw(self, surface, camera_x, camera_y, zoom=1):
+        return surface.blit(scaled_sprite(self.image, zoom), ((self.x - camera_x - 10) * zoom,
+                                                              (self.y - camera_y - 10) * zoom))
 
 
 class FloatingText:
@@ -111,18 +338,19 @@ class FloatingText:
         self.timer = 60
         self.vel_y = -2
         self.alpha = 255
+        # A private copy: its alpha changes while it fades
+        self.surface = render_text(text, 36, color).copy()
 
     def update(self):
         self.y += self.vel_y
         self.timer -= 1
         self.alpha = int((self.timer / 60) * 255)
 
-    def draw(self, surface, camera_x, camera_y):
+    def draw(self, surface, camera_x, camera_y, zoom=1):
         if self.timer > 0:
-            font = pygame.font.Font(None, 36)
-            text_surf = font.render(self.text, True, self.color)
-            text_surf.set_alpha(self.alpha)
-            surface.blit(text_surf, (self.x - camera_x, self.y - camera_y))
+            self.surface.set_alpha(self.alpha)
+            return surface.blit(self.surface, ((self.x - camera_x) * zoom, (self.y - camera_y) * zoom))
+        return None
 
     def is_alive(self):
         return self.timer > 0
@@ -133,7 +361,9 @@ class DialogueSystem:
         self.active = False
         self.dialogues = []
         self.current_index = 0
-        self.font = pygame.font.Font(None, 28)
+        self.font = get_font(28)
+        # (text, width) -> wrapped lines
+        self.wrapped = {}
 
     def start_dialogue(self, dialogues):
         self.dialogues = dialogues
@@ -147,9 +377,27 @@ class DialogueSystem:
                 self.active = False
                 self.current_index = 0
 
+    def wrap(self, text, max_width):
+        """Split text into lines narrower than max_width, measured once per text and width"""
+        lines = self.wrapped.get((text, max_width))
+        if lines is None:
+            lines = self.wrapped[(text, max_width)] = []
+            current_line = ""
+            for word in text.split(' '):
+                test_line = current_line + word + " "
+                if self.font.size(test_line)[0] < max_width:
+                    current_line = test_line
+                else:
+                    if current_line:
+                        lines.append(current_line)
+                    current_line = word + " "
+            if current_line:
+                lines.append(current_line)
+        return lines
+
     def draw(self, surface, screen_width, screen_height):
         if not self.active or not self.dialogues:
-            return
+            return None
 
         box_height = 120
         box_y = screen_height - box_height - 10
@@ -163,33 +411,17 @@ class DialogueSystem:
         pygame.draw.rect(surface, (255, 255, 255), box_rect, 3)
 
         if self.current_index < len(self.dialogues):
-            text = self.dialogues[self.current_index]
-            words = text.split(' ')
-            lines = []
-            current_line = ""
-            max_width = box_rect.width - 40
-
-            for word in words:
-                test_line = current_line + word + " "
-                if self.font.size(test_line)[0] < max_width:
-                    current_line = test_line
-                else:
-                    if current_line:
-                        lines.append(current_line)
-                    current_line = word + " "
-            if current_line:
-                lines.append(current_line)
+            lines = self.wrap(self.dialogues[self.current_index], box_rect.width - 40)
 
             y_offset = box_y + 20
             for line in lines[:3]:
-                text_surf = self.font.render(
-                    line.strip(), True, (255, 255, 255))
+                text_surf = render_text(line.strip(), 28, (255, 255, 255))
                 surface.blit(text_surf, (box_rect.x + 20, y_offset))
                 y_offset += 30
 
-        prompt = self.font.render(
-            "Press SPACE to continue...", True, (200, 200, 200))
+        prompt = render_text("Press SPACE to continue...", 28, (200, 200, 200))
         surface.blit(prompt, (box_rect.x + 20, box_rect.bottom - 35))
+        return box_rect
 
 
 class NPC:
@@ -262,30 +494,27 @@ class NPC:
 
     def can_interact(self, player):
         """Check if player is close enough to interact"""
-        distance = math.sqrt((self.pixel_x - player.pixel_x)
-                             ** 2 + (self.pixel_y - player.pixel_y)**2)
-        return distance <= self.interaction_range
+        dx = self.pixel_x - player.pixel_x
+        dy = self.pixel_y - player.pixel_y
+        return dx * dx + dy * dy <= self.interaction_range ** 2
 
-    def draw(self, surface, camera_x, camera_y):
-        surface.blit(self.image, (self.pixel_x -
-                     camera_x, self.pixel_y - camera_y))
+    def draw(self, surface, camera_x, camera_y, zoom=1):
+        screen_x = (self.pixel_x - camera_x) * zoom
+        screen_y = (self.pixel_y - camera_y) * zoom
+        rect = surface.blit(scaled_sprite(self.image, zoom), (screen_x, screen_y))
 
         # Draw name tag
-        font = pygame.font.Font(None, 20)
-        name_surf = font.render(self.npc_name.upper(), True, (255, 255, 255))
-        name_x = self.pixel_x - camera_x + \
-            (self.render_w - name_surf.get_width()) // 2
-        name_y = self.pixel_y - camera_y - 15
+        name_surf = render_text(self.npc_name.upper(), 20, (255, 255, 255))
+        name_x = screen_x + (self.render_w * zoom - name_surf.get_width()) // 2
+        name_y = screen_y - 15
 
         # Draw background for name
         bg_rect = pygame.Rect(
             name_x - 5, name_y - 2, name_surf.get_width() + 10, name_surf.get_height() + 4)
-        bg_surf = pygame.Surface((bg_rect.width, bg_rect.height))
-        bg_surf.set_alpha(180)
-        bg_surf.fill((0, 0, 0))
-        surface.blit(bg_surf, bg_rect.topleft)
+        rect.union_ip(surface.blit(translucent_box(bg_rect.size, (0, 0, 0), 180), bg_rect.topleft))
 
         surface.blit(name_surf, (name_x, name_y))
+        return rect
 
 
 class Player:
@@ -434,6 +663,8 @@ class Player:
         self.animations['walking'] = load_folder('walking')
         self.animations['attacking'] = load_folder('attacking')
         self.animations['dying'] = load_folder('dying')
+        for frames in self.animations.values():
+            prepare_sprite_variants(frames, flipped=True)
 
     def set_tile_size(self, tile_w, tile_h):
         self.tile_w = tile_w
@@ -505,7 +736,7 @@ class Player:
                 if self.state == State.ATTACKING:
                     self.state = State.IDLE
 
-    def handle_input(self, keys, collision_rects, map_width, map_height):
+    def handle_input(self, keys, game_map):
         moving = False
         if self.state != State.DEAD:
             current_speed = self.run_speed if (
@@ -537,8 +768,8 @@ class Player:
 
             new_rect = pygame.Rect(
                 self.pixel_x+dx, self.pixel_y+dy, self.tile_w, self.tile_h)
-            if not any(new_rect.colliderect(r) for r in collision_rects):
-                if 0 <= new_rect.x <= map_width*self.tile_w - self.tile_w and 0 <= new_rect.y <= map_height*self.tile_h - self.tile_h:
+            if not game_map.rect_blocked(new_rect):
+                if 0 <= new_rect.x <= game_map.width*self.tile_w - self.tile_w and 0 <= new_rect.y <= game_map.height*self.tile_h - self.tile_h:
                     self.pixel_x += dx
                     self.pixel_y += dy
 
@@ -573,7 +804,7 @@ class Player:
             self.frame_index = 0
             self.animation_counter = 0.0
 
-    def draw(self, surface, camera_x, camera_y):
+    def draw(self, surface, camera_x, camera_y, zoom=1):
         anim_key = getattr(self, 'current_anim_key', 'idle')
         frames = self.animations.get(anim_key, [])
         if not frames:
@@ -584,38 +815,27 @@ class Player:
         else:
             idx = max(0, min(self.frame_index, len(frames)-1))
             img = frames[idx]
-
-        if self.current_direction == 'left':
-            img = pygame.transform.flip(img, True, False)
-
-        if self.hit_flash > 0:
-            flash_img = img.copy()
-            flash_img.fill((255, 255, 255, 100),
-                           special_flags=pygame.BLEND_RGB_ADD)
-            surface.blit(flash_img, (self.pixel_x -
-                         camera_x, self.pixel_y - camera_y))
-        else:
-            surface.blit(img, (self.pixel_x - camera_x,
-                         self.pixel_y - camera_y))
+        img = sprite_variant(img, zoom, flipped=self.current_direction == 'left',
+                             flashed=self.hit_flash > 0)
+        screen_x = (self.pixel_x - camera_x) * zoom
+        screen_y = (self.pixel_y - camera_y) * zoom
+        rect = surface.blit(img, (screen_x, screen_y))
         
         # Draw player name tag (Face ID-аас танигдсан нэр)
         if hasattr(self, 'player_name') and self.player_name:
-            font = pygame.font.Font(None, 20)
-            name_surf = font.render(self.player_name, True, (0, 255, 159))  # Face Lock өнгө
-            name_x = self.pixel_x - camera_x + (self.render_w - name_surf.get_width()) // 2
-            name_y = self.pixel_y - camera_y - 15
+            name_surf = render_text(self.player_name, 20, (0, 255, 159))  # Face Lock өнгө
+            name_x = screen_x + (self.render_w * zoom - name_surf.get_width()) // 2
+            name_y = screen_y - 15
             
             # Draw background for name
             bg_rect = pygame.Rect(name_x - 5, name_y - 2, name_surf.get_width() + 10, name_surf.get_height() + 4)
-            bg_surf = pygame.Surface((bg_rect.width, bg_rect.height))
-            bg_surf.set_alpha(200)
-            bg_surf.fill((10, 14, 39))  # Face Lock dark background
-            surface.blit(bg_surf, bg_rect.topleft)
+            surface.blit(translucent_box(bg_rect.size, (10, 14, 39), 200), bg_rect.topleft)  # Face Lock dark background
             
             # Draw border
-            pygame.draw.rect(surface, (0, 255, 159), bg_rect, 1)
+            rect.union_ip(pygame.draw.rect(surface, (0, 255, 159), bg_rect, 1))
             
             surface.blit(name_surf, (name_x, name_y))
+        return rect
 
 
 class Slime:
@@ -659,6 +879,10 @@ class Slime:
         self.load_animations()
 
     def load_animations(self):
+        key = ('slime', self.slime_type, self.render_w, self.render_h)
+        if key in ENEMY_SPRITES:
+            self.idle_frames, self.attack_frames = ENEMY_SPRITES[key]
+            return
         base = os.path.join(os.path.dirname(
             os.path.abspath(__file__)), 'image')
         self.idle_frames = []
@@ -710,6 +934,8 @@ class Slime:
                                    (self.render_w//2, self.render_h//2), self.render_w//3)
             self.idle_frames = [placeholder]
             self.attack_frames = [placeholder]
+        prepare_sprite_variants(self.idle_frames + self.attack_frames, faded=True)
+        ENEMY_SPRITES[key] = (self.idle_frames, self.attack_frames)
 
     def take_damage(self, damage, is_crit=False):
         if self.state != State.DEAD:
@@ -726,7 +952,7 @@ class Slime:
                 self.state = State.HURT
             return False, 0
 
-    def update(self, player, collision_rects, map_width, map_height, game=None):
+    def update(self, player, game_map, game=None):
         if self.state == State.DEAD:
             return
 
@@ -745,14 +971,29 @@ class Slime:
             dy = player.pixel_y - self.pixel_y
             length = (dx**2 + dy**2)**0.5
 
+            # Follow the shared flow field around walls when the player is not in a straight line
+            step = game_map.flow_step(self.pixel_x + self.tile_w / 2, self.pixel_y + self.tile_h / 2)
+            if step:
+                dx = step[0] - self.pixel_x
+                dy = step[1] - self.pixel_y
+                length = (dx**2 + dy**2)**0.5
+
             if length > 0:
-                dx = (dx / length) * self.speed
-                dy = (dy / length) * self.speed
-                new_rect = pygame.Rect(
-                    self.pixel_x + dx, self.pixel_y + dy, self.tile_w, self.tile_h)
-                if not any(new_rect.colliderect(r) for r in collision_rects):
-                    self.pixel_x += dx
-                    self.pixel_y += dy
+                new_x = self.pixel_x + (dx / length) * self.speed
+                new_y = self.pixel_y + (dy / length) * self.speed
+                if step:
+                    # Land exactly on the next tile's row/column so the slime fits through doorways
+                    if abs(step[0] - self.pixel_x) <= max(1, abs(new_x - self.pixel_x)):
+                        new_x = step[0]
+                    if abs(step[1] - self.pixel_y) <= max(1, abs(new_y - self.pixel_y)):
+                        new_y = step[1]
+                # Slide along walls instead of stopping dead
+                for x, y in ((new_x, new_y), (new_x, self.pixel_y), (self.pixel_x, new_y)):
+                    new_rect = pygame.Rect(x, y, self.tile_w, self.tile_h)
+                    if (x, y) != (self.pixel_x, self.pixel_y) and not game_map.rect_blocked(new_rect):
+                        self.pixel_x = x
+                        self.pixel_y = y
+                        break
 
             if distance <= self.attack_range and self.attack_cooldown == 0:
                 player.take_damage(self.attack_damage)
@@ -771,8 +1012,8 @@ class Slime:
                 dy = self.wander_direction[1] * self.speed * 0.5
                 new_rect = pygame.Rect(
                     self.pixel_x + dx, self.pixel_y + dy, self.tile_w, self.tile_h)
-                if not any(new_rect.colliderect(r) for r in collision_rects):
-                    if 0 <= new_rect.x <= map_width*self.tile_w and 0 <= new_rect.y <= map_height*self.tile_h:
+                if not game_map.rect_blocked(new_rect):
+                    if 0 <= new_rect.x <= game_map.width*self.tile_w and 0 <= new_rect.y <= game_map.height*self.tile_h:
                         self.pixel_x += dx
                         self.pixel_y += dy
 
@@ -790,31 +1031,29 @@ class Slime:
                 else:
                     self.frame_index = (self.frame_index + 1) % len(frames)
 
-    def draw(self, surface, camera_x, camera_y):
+    def draw(self, surface, camera_x, camera_y, zoom=1):
         frames = self.attack_frames if self.state == State.ATTACKING else self.idle_frames
+        screen_x = (self.pixel_x - camera_x) * zoom
+        screen_y = (self.pixel_y - camera_y) * zoom
         if frames:
             idx = max(0, min(self.frame_index, len(frames)-1))
-            img = frames[idx].copy()
+            img = sprite_variant(frames[idx], zoom, flashed=self.hit_flash > 0,
+                                 faded=self.state == State.DEAD)
+            rect = surface.blit(img, (screen_x, screen_y))
         else:
-            img = pygame.Surface(
-                (self.render_w, self.render_h), pygame.SRCALPHA)
-
-        if self.hit_flash > 0:
-            img.fill((255, 255, 255, 100), special_flags=pygame.BLEND_RGB_ADD)
-        if self.state == State.DEAD:
-            img.set_alpha(100)
-        surface.blit(img, (self.pixel_x - camera_x, self.pixel_y - camera_y))
+            rect = pygame.Rect(screen_x, screen_y, 0, 0)
 
         if self.state != State.DEAD:
-            bar_width = self.render_w
+            bar_width = self.render_w * zoom
             bar_height = 5
-            bar_x = self.pixel_x - camera_x
-            bar_y = self.pixel_y - camera_y - 10
-            pygame.draw.rect(surface, (100, 0, 0),
-                             (bar_x, bar_y, bar_width, bar_height))
+            bar_x = screen_x
+            bar_y = screen_y - 10
+            rect.union_ip(pygame.draw.rect(surface, (100, 0, 0),
+                                           (bar_x, bar_y, bar_width, bar_height)))
             health_width = int((self.health / self.max_health) * bar_width)
             pygame.draw.rect(surface, (0, 255, 0),
                              (bar_x, bar_y, health_width, bar_height))
+        return rect
 
 
 class Tower:
@@ -872,7 +1111,12 @@ class Tower:
         self.hit_flash = 0
         self.shoot_cooldown = 0
 
-        self.load_image()
+        key = ('tower', self.tower_type, self.render_w, self.render_h)
+        self.image = ENEMY_SPRITES.get(key)
+        if self.image is None:
+            self.load_image()
+            prepare_sprite_variants([self.image], faded=True)
+            ENEMY_SPRITES[key] = self.image
 
     def load_image(self):
         try:
@@ -934,7 +1178,7 @@ class Tower:
                 self.state = State.HURT
             return False, 0
 
-    def update(self, player):
+    def update(self, player, game_map=None):
         if self.state == State.DEAD:
             return None
 
@@ -949,35 +1193,38 @@ class Tower:
                     (self.pixel_y - player.pixel_y)**2)**0.5
 
         if distance <= self.detection_range and self.shoot_cooldown == 0 and player.state != State.DEAD:
-            self.shoot_cooldown = self.shoot_interval
             # Shoot from the top center of the tower
             center_x = self.pixel_x + self.render_w // 2
             center_y = self.pixel_y + self.render_h // 4  # Shoot from top quarter of tower
             target_x = player.pixel_x + player.tile_w // 2
             target_y = player.pixel_y + player.tile_h // 2
+            # Hold fire while a wall is in the way
+            if game_map and not game_map.line_of_sight((center_x, center_y), (target_x, target_y)):
+                return None
+            self.shoot_cooldown = self.shoot_interval
             return Projectile(center_x, center_y, target_x, target_y, self.attack_damage,
                               is_enemy=True, projectile_type=self.tower_type)
 
         return None
 
-    def draw(self, surface, camera_x, camera_y):
-        img = self.image.copy()
-        if self.hit_flash > 0:
-            img.fill((255, 255, 255, 100), special_flags=pygame.BLEND_RGB_ADD)
-        if self.state == State.DEAD:
-            img.set_alpha(100)
-        surface.blit(img, (self.pixel_x - camera_x, self.pixel_y - camera_y))
+    def draw(self, surface, camera_x, camera_y, zoom=1):
+        img = sprite_variant(self.image, zoom, flashed=self.hit_flash > 0,
+                             faded=self.state == State.DEAD)
+        screen_x = (self.pixel_x - camera_x) * zoom
+        screen_y = (self.pixel_y - camera_y) * zoom
+        rect = surface.blit(img, (screen_x, screen_y))
 
         if self.state != State.DEAD:
-            bar_width = self.render_w
+            bar_width = self.render_w * zoom
             bar_height = 6
-            bar_x = self.pixel_x - camera_x
-            bar_y = self.pixel_y - camera_y - 12
-            pygame.draw.rect(surface, (100, 0, 0),
-                             (bar_x, bar_y, bar_width, bar_height))
+            bar_x = screen_x
+            bar_y = screen_y - 12
+            rect.union_ip(pygame.draw.rect(surface, (100, 0, 0),
+                                           (bar_x, bar_y, bar_width, bar_height)))
             health_width = int((self.health / self.max_health) * bar_width)
             pygame.draw.rect(surface, (255, 0, 0),
                              (bar_x, bar_y, health_width, bar_height))
+        return rect
 
 
 class Boss:
@@ -999,7 +1246,12 @@ class Boss:
         self.shoot_interval = 120
         self.detection_range = 400
 
-        self.load_image()
+        key = ('boss', None, self.render_w, self.render_h)
+        self.image = ENEMY_SPRITES.get(key)
+        if self.image is None:
+            self.load_image()
+            prepare_sprite_variants([self.image], faded=True)
+            ENEMY_SPRITES[key] = self.image
 
     def load_image(self):
         try:
@@ -1030,7 +1282,7 @@ class Boss:
                 self.state = State.HURT
             return False, 0
 
-    def update(self, player):
+    def update(self, player, game_map=None):
         if self.state == State.DEAD:
             return None
 
@@ -1045,281 +1297,924 @@ class Boss:
                     (self.pixel_y - player.pixel_y)**2)**0.5
 
         if distance <= self.detection_range and self.shoot_cooldown == 0 and player.state != State.DEAD:
-            self.shoot_cooldown = self.shoot_interval
             center_x = self.pixel_x + self.render_w // 2
             center_y = self.pixel_y + self.render_h // 2
             target_x = player.pixel_x + player.tile_w // 2
             target_y = player.pixel_y + player.tile_h // 2
+            if game_map and not game_map.line_of_sight((center_x, center_y), (target_x, target_y)):
+                return None
+            self.shoot_cooldown = self.shoot_interval
             return Projectile(center_x, center_y, target_x, target_y, self.attack_damage,
                               is_enemy=True, projectile_type='void')
 
         return None
 
-    def draw(self, surface, camera_x, camera_y):
-        img = self.image.copy()
-        if self.hit_flash > 0:
-            img.fill((255, 255, 255, 100), special_flags=pygame.BLEND_RGB_ADD)
-        if self.state == State.DEAD:
-            img.set_alpha(100)
-        surface.blit(img, (self.pixel_x - camera_x, self.pixel_y - camera_y))
+    def draw(self, surface, camera_x, camera_y, zoom=1):
+        img = sprite_variant(self.image, zoom, flashed=self.hit_flash > 0,
+                             faded=self.state == State.DEAD)
+        screen_x = (self.pixel_x - camera_x) * zoom
+        screen_y = (self.pixel_y - camera_y) * zoom
+        rect = surface.blit(img, (screen_x, screen_y))
 
         if self.state != State.DEAD:
-            bar_width = self.render_w
+            bar_width = self.render_w * zoom
             bar_height = 8
-            bar_x = self.pixel_x - camera_x
-            bar_y = self.pixel_y - camera_y - 15
-            pygame.draw.rect(surface, (100, 0, 0),
-                             (bar_x, bar_y, bar_width, bar_height))
+            bar_x = screen_x
+            bar_y = screen_y - 15
+            rect.union_ip(pygame.draw.rect(surface, (100, 0, 0),
+                                           (bar_x, bar_y, bar_width, bar_height)))
             health_width = int((self.health / self.max_health) * bar_width)
             pygame.draw.rect(surface, (255, 0, 0),
                              (bar_x, bar_y, health_width, bar_height))
+        return rect
 
 
 class Camera:
-    def __init__(self, screen_width, screen_height, map_width, map_height):
+    def __init__(self, screen_width, screen_height, map_width, map_height, zoom=1):
         self.screen_width = screen_width
         self.screen_height = screen_height
         self.map_width = map_width
         self.map_height = map_height
+        self.zoom = zoom
         self.x = 0
         self.y = 0
 
+    def view_size(self):
+        """Width and height of the visible world area in map pixels"""
+        return self.screen_width / self.zoom, self.screen_height / self.zoom
+
     def update(self, target_x, target_y, target_width, target_height):
-        self.x = target_x + target_width // 2 - self.screen_width // 2
-        self.y = target_y + target_height // 2 - self.screen_height // 2
-        self.x = max(0, min(self.x, self.map_width - self.screen_width))
-        self.y = max(0, min(self.y, self.map_height - self.screen_height))
+        view_w, view_h = self.view_size()
+        x = target_x + target_width // 2 - view_w / 2
+        y = target_y + target_height // 2 - view_h / 2
+        self.x = int(max(0, min(x, self.map_width - view_w)))
+        self.y = int(max(0, min(y, self.map_height - view_h)))
+
+    def screen_to_world(self, screen_x, screen_y):
+        return self.x + screen_x / self.zoom, self.y + screen_y / self.zoom
 
     def update_screen_size(self, screen_width, screen_height):
         self.screen_width = screen_width
         self.screen_height = screen_height
 
 
-class GameMap:
-    def __init__(self, tmx_file):
-        self.current_map_file = tmx_file  # Store for tower building
+class MapObject:
+    """Plain copy of a Tiled object, so maps can be rebuilt without pytmx"""
+    FIELDS = ('id', 'name', 'type', 'x', 'y', 'width', 'height', 'gid')
+
+    def __init__(self, record):
+        for field in self.FIELDS:
+            setattr(self, field, record.get(field))
+        self.properties = record.get('properties') or {}
+        # Lower-cased type (or name) used to pick the object's factory
+        self.kind = str(self.type or self.name or '').lower()
+
+    @classmethod
+    def from_tiled(cls, obj):
+        record = {field: getattr(obj, field, None) for field in cls.FIELDS}
+        record['properties'] = dict(getattr(obj, 'properties', {}) or {})
+        return cls(record)
+
+    def to_record(self):
+        record = {field: getattr(self, field) for field in self.FIELDS}
+        record['properties'] = self.properties
+        return record
+
+
+class Tileset:
+    """One decoded tileset image plus the tile Surfaces already cut from it"""
+
+    def __init__(self, path, mtime, lock):
+        self.path = path
+        self.mtime = mtime
+        self.image = pygame.image.load(path)
+        self.tiles = {}
+        self.lock = lock
+
+    def tile(self, rect, flags, colorkey, convert):
+        """Return the shared Surface for one tile; convert(surface) sets its display
+        format the first time the tile is cut out"""
+        key = (tuple(rect) if rect else None,
+               tuple(bool(f) for f in flags) if flags and any(flags) else None,
+               colorkey)
+        with self.lock:
+            tile = self.tiles.get(key)
+            if tile is None:
+                tile = self.image.subsurface(rect) if rect else self.image.copy()
+                if key[1]:
+                    tile = handle_transformation(tile, pytmx.TileFlags(*key[1]))
+                tile = convert(tile)
+                self.tiles[key] = tile
+            return tile
+
+    def decoded_bytes(self):
+        surfaces = [self.image] + list(self.tiles.values())
+        return sum(surf.get_width() * surf.get_height() * surf.get_bytesize()
+                   for surf in surfaces)
+
+
+class TilesetCache:
+    """Process-wide tileset images keyed by absolute path and modification time.
+
+    Maps that share a tileset, and maps loaded again, get the same tile
+    Surfaces instead of decoding and converting the image once more."""
+
+    def __init__(self):
+        self.tilesets = {}
+        self.hits = 0
+        self.misses = 0
+        # MapPreloader loads maps from its worker thread
+        self.lock = threading.RLock()
+
+    def get(self, filename):
+        path = os.path.abspath(filename)
+        mtime = os.path.getmtime(path)
+        with self.lock:
+            tileset = self.tilesets.get(path)
+            if tileset is not None and tileset.mtime == mtime:
+                self.hits += 1
+                return tileset
+            # New or edited image: the old Surfaces are dropped with the old entry
+            self.misses += 1
+            tileset = Tileset(path, mtime, self.lock)
+            self.tilesets[path] = tileset
+            return tileset
+
+    def retain(self, paths):
+        """Forget the tilesets not in paths; maps still holding their tiles keep those alive"""
+        with self.lock:
+            for path in [path for path in self.tilesets if path not in paths]:
+                del self.tilesets[path]
+
+    def clear(self):
+        self.retain(())
+
+    def decoded_bytes(self):
+        with self.lock:
+            return sum(tileset.decoded_bytes() for tileset in self.tilesets.values())
+
+    def stats(self):
+        with self.lock:
+            tiles = sum(len(tileset.tiles) for tileset in self.tilesets.values())
+        return (f"{len(self.tilesets)} tilesets, {tiles} tiles, "
+                f"{self.decoded_bytes() / (1024 * 1024):.1f} MB decoded, "
+                f"{self.hits} hits, {self.misses} misses")
+
+
+TILESET_CACHE = TilesetCache()
+
+
+def load_tmx(tmx_file):
+    """Parse a TMX with pytmx, remembering which image region every tile came from"""
+    image_sources = {}
+
+    def image_loader(filename, colorkey, **kwargs):
+        tileset = TILESET_CACHE.get(filename)
+        color = pygame.Color(f"#{colorkey}") if colorkey else None
+        pixelalpha = kwargs.get('pixelalpha', True)
+
+        def load_tile(rect=None, flags=None):
+            tile = tileset.tile(rect, flags, colorkey,
+                                lambda surface: smart_convert(surface, color, pixelalpha))
+            image_sources[id(tile)] = (tile, filename, colorkey, rect, flags)
+            return tile
+        return load_tile
+
+    tmx_data = pytmx.TiledMap(tmx_file, image_loader=image_loader)
+    tmx_data.image_sources = image_sources
+    return tmx_data
+
+
+def compiled_map_path(tmx_file):
+    tmx_dir, name = os.path.split(os.path.abspath(tmx_file))
+    return os.path.join(tmx_dir, MAP_CACHE_DIR_NAME, os.path.splitext(name)[0] + '.npz')
+
+
+def map_source_hash(tmx_file, image_sources=()):
+    """Hash the TMX together with every external TSX it references, and the size
+    and modification time of the tile images (image_sources of the compiled map)"""
+    digest = hashlib.sha1(f"v{MAP_CACHE_VERSION}".encode())
+    with open(tmx_file, 'rb') as f:
+        data = f.read()
+    digest.update(data)
+
+    tmx_dir = os.path.dirname(os.path.abspath(tmx_file))
+    for source in re.findall(rb'<tileset[^>]*\ssource="([^"]+)"', data):
+        digest.update(source)
         try:
-            self.tmx_data = load_pygame(tmx_file)
-        except Exception as e:
-            print(f"Error loading TMX file: {e}")
-            print("Attempting to auto-fix tileset source paths...")
-
-            import xml.etree.ElementTree as ET
-
-            tmx_dir = os.path.dirname(os.path.abspath(tmx_file))
-            tree = ET.parse(tmx_file)
-            root = tree.getroot()
-            changed = False
-
-            for tileset in root.findall('tileset'):
-                src = tileset.get('source')
-                if src:
-                    base = os.path.basename(src)
-                    candidate = os.path.join(tmx_dir, base)
-                    if os.path.exists(candidate):
-                        tileset.set('source', candidate)
-                        changed = True
-                    else:
-                        placeholder_tsx = candidate
-                        placeholder_img = os.path.join(
-                            tmx_dir, base.replace('.tsx', '.png'))
-                        try:
-                            if not os.path.exists(placeholder_img):
-                                try:
-                                    from PIL import Image
-                                    Image.new('RGBA', (32, 32), (0, 0, 0, 0)).save(
-                                        placeholder_img)
-                                except Exception:
-                                    with open(placeholder_img, 'wb') as f:
-                                        f.write(b'\x89PNG\r\n\x1a\n')
-
-                            with open(placeholder_tsx, 'w', encoding='utf-8') as f:
-                                f.write(
-                                    '<?xml version="1.0" encoding="UTF-8"?>\n')
-                                f.write(
-                                    f'<tileset version="1.10" tiledversion="1.11.2" name="{base.replace(".tsx", "")}" tilewidth="32" tileheight="32" tilecount="1" columns="1">\n')
-                                f.write(
-                                    f' <image source="{os.path.basename(placeholder_img)}" width="32" height="32"/>\n')
-                                f.write('</tileset>\n')
-
-                            tileset.set('source', placeholder_tsx)
-                            changed = True
-                            print(
-                                f"Created placeholder tileset: {placeholder_tsx}")
-                        except Exception:
-                            pass
+            with open(os.path.join(tmx_dir, source.decode('utf-8')), 'rb') as f:
+                digest.update(f.read())
+        except (OSError, UnicodeDecodeError):
+            pass
 
-            for tileset in root.findall('tileset'):
-                img_elem = tileset.find('image')
-                if img_elem is not None:
-                    img_src = img_elem.get('source')
-                    if img_src:
-                        img_base = os.path.basename(img_src)
-                        img_candidate = os.path.join(tmx_dir, img_base)
-                        if os.path.exists(img_candidate):
-                            img_elem.set('source', img_candidate)
-                            changed = True
-                        else:
-                            try:
-                                placeholder_path = img_candidate
-                                if not os.path.exists(placeholder_path):
-                                    try:
-                                        from PIL import Image
-                                        Image.new('RGBA', (32, 32), (0, 0, 0, 0)).save(
-                                            placeholder_path)
-                                        print(
-                                            f"Created placeholder image: {placeholder_path}")
-                                    except Exception:
-                                        with open(placeholder_path, 'wb') as f:
-                                            f.write(b'\x89PNG\r\n\x1a\n')
-                                img_elem.set('source', placeholder_path)
-                                changed = True
-                            except Exception:
-                                pass
-
-            if changed:
-                fixed_path = os.path.join(tmx_dir, os.path.basename(
-                    tmx_file).replace('.tmx', '_fixed.tmx'))
-                tree.write(fixed_path, encoding='utf-8', xml_declaration=True)
-                print(f"Wrote fixed TMX to: {fixed_path}")
-
-                for tileset in root.findall('tileset'):
-                    src = tileset.get('source')
-                    if not src:
-                        continue
-                    tsx_path = src
-                    if not os.path.isabs(tsx_path):
-                        tsx_path = os.path.join(tmx_dir, tsx_path)
+    # Tile modes and minimap colours come from the image pixels
+    for source, _ in image_sources:
+        digest.update(source.encode('utf-8'))
+        try:
+            stat = os.stat(os.path.join(tmx_dir, source))
+            digest.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+        except OSError:
+            pass
+    return digest.hexdigest()
 
-                    if not os.path.exists(tsx_path):
-                        continue
 
-                    try:
-                        ts_tree = ET.parse(tsx_path)
-                        ts_root = ts_tree.getroot()
-                        img = ts_root.find('image')
-                        if img is not None:
-                            img_src = img.get('source')
-                            if img_src:
-                                img_base = os.path.basename(img_src)
-                                img_candidate = os.path.join(tmx_dir, img_base)
-                                if os.path.exists(img_candidate):
-                                    img.set('source', img_candidate)
-                                    ts_tree.write(
-                                        tsx_path, encoding='utf-8', xml_declaration=True)
-                                else:
-                                    placeholder_path = img_candidate
-                                    if not os.path.exists(placeholder_path):
-                                        try:
-                                            from PIL import Image
-                                            placeholder = Image.new(
-                                                'RGBA', (32, 32), (0, 0, 0, 0))
-                                            placeholder.save(placeholder_path)
-                                            print(
-                                                f"Created placeholder image: {placeholder_path}")
-                                            img.set('source', placeholder_path)
-                                            ts_tree.write(
-                                                tsx_path, encoding='utf-8', xml_declaration=True)
-                                        except Exception:
-                                            try:
-                                                with open(placeholder_path, 'wb') as f:
-                                                    f.write(
-                                                        b'\x89PNG\r\n\x1a\n')
-                                                img.set(
-                                                    'source', placeholder_path)
-                                                ts_tree.write(
-                                                    tsx_path, encoding='utf-8', xml_declaration=True)
-                                                print(
-                                                    f"Wrote minimal placeholder PNG: {placeholder_path}")
-                                            except Exception:
-                                                pass
-                    except Exception:
-                        pass
+def save_compiled_map(tmx_file, compiled):
+    """Write a compiled map next to its TMX as an .npz file"""
+    path = compiled_map_path(tmx_file)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if compiled['layers']:
+            layers = np.stack(compiled['layers'])
+        else:
+            layers = np.zeros((0, compiled['height'], compiled['width']), dtype=np.int32)
+        records = json.dumps({
+            'image_sources': compiled['image_sources'],
+            'objects': compiled['objects'],
+            'properties': compiled['properties'],
+            'animations': compiled['animations'],
+        }, default=str)
+
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(
+                f,
+                source_hash=np.array(compiled['source_hash']),
+                meta=np.array([compiled['tile_w'], compiled['tile_h'],
+                               compiled['width'], compiled['height']], dtype=np.int32),
+                layers=layers,
+                collision=compiled['collision'],
+                image_index=compiled['image_index'],
+                image_rects=compiled['image_rects'],
+                image_flags=compiled['image_flags'],
+                image_modes=compiled['image_modes'],
+                image_colours=compiled['image_colours'],
+                records=np.array(records))
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"Could not write compiled map {path}: {e}")
 
-                try:
-                    self.tmx_data = load_pygame(fixed_path)
-                except Exception as load_err:
-                    print("Auto-fix failed when loading the fixed TMX:", load_err)
-                    raise
+
+def load_compiled_map(tmx_file):
+    """Return the compiled map for tmx_file, or None if it is missing or stale"""
+    path = compiled_map_path(tmx_file)
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as data:
+            records = json.loads(str(data['records']))
+            source_hash = map_source_hash(tmx_file, records['image_sources'])
+            if str(data['source_hash']) != source_hash:
+                return None
+            tile_w, tile_h, width, height = (int(v) for v in data['meta'])
+            return {
+                'source_hash': source_hash,
+                'tile_w': tile_w,
+                'tile_h': tile_h,
+                'width': width,
+                'height': height,
+                'layers': list(data['layers']),
+                'collision': data['collision'],
+                'image_index': data['image_index'],
+                'image_rects': data['image_rects'],
+                'image_flags': data['image_flags'],
+                'image_modes': data['image_modes'],
+                'image_colours': data['image_colours'],
+                'image_sources': records['image_sources'],
+                'objects': records['objects'],
+                'properties': records['properties'],
+                'animations': {int(gid): frames for gid, frames in records['animations'].items()},
+            }
+    except Exception as e:
+        print(f"Ignoring unreadable compiled map {path}: {e}")
+        return None
+
+
+def tile_layer_arrays(tmx):
+    """Convert every visible tile layer into a (height, width) gid array"""
+    arrays = []
+    for layer in tmx.visible_layers:
+        if isinstance(layer, pytmx.TiledTileLayer):
+            arrays.append(np.array(layer.data, dtype=np.int32))
+    return arrays
+
+
+def collision_grid(tmx):
+    """Mark every blocked tile in a (height, width) bool array"""
+    grid = np.zeros((tmx.height, tmx.width), dtype=bool)
+    layers = list(tmx.visible_layers)
+
+    if layers:
+        bottom_layer = layers[0]
+        if isinstance(bottom_layer, pytmx.TiledTileLayer):
+            if bottom_layer.properties.get("blocked") or bottom_layer.name.lower() == "collision":
+                grid |= np.array(bottom_layer.data) != 0
+                return grid
+
+    try:
+        collision_layer = tmx.get_layer_by_name("collision")
+        if collision_layer and collision_layer.properties.get("blocked"):
+            grid |= np.array(collision_layer.data) != 0
+    except Exception as e:
+        print(f"Warning: Could not load collision layer: {e}")
+
+    for layer in tmx.visible_layers:
+        if isinstance(layer, pytmx.TiledTileLayer):
+            if layer.properties.get("blocked"):
+                grid |= np.array(layer.data) != 0
+    return grid
+
+
+def tile_animations(tmx):
+    """gid -> [[frame gid, duration in ms], ...] for every animated tile"""
+    animations = {}
+    for gid, props in tmx.tile_properties.items():
+        frames = props.get('frames')
+        if frames and sum(frame.duration for frame in frames) > 0:
+            animations[gid] = [[frame.gid, frame.duration] for frame in frames]
+    return animations
+
+
+def compile_tmx(tmx, tmx_file):
+    """Flatten a parsed TMX into the arrays and records stored by save_compiled_map"""
+    tmx_dir = os.path.dirname(os.path.abspath(tmx_file))
+    count = len(tmx.images)
+    image_index = np.full(count, -1, dtype=np.int32)
+    image_rects = np.zeros((count, 4), dtype=np.int32)
+    image_flags = np.zeros((count, 3), dtype=np.uint8)
+    image_modes = np.zeros(count, dtype=np.uint8)
+    # Average RGBA of every tile image, for the minimap
+    image_colours = np.zeros((count, 4), dtype=np.uint8)
+    image_sources = []
+    source_ids = {}
+    complete = True
+
+    for gid, image in enumerate(tmx.images):
+        if not image:
+            continue
+        if image.get_flags() & pygame.SRCALPHA:
+            image_colours[gid] = pygame.transform.average_color(image, image.get_rect(), True)
+        else:
+            image_colours[gid] = pygame.transform.average_color(image)[:3] + (255,)
+        record = tmx.image_sources.get(id(image))
+        if record is None or record[0] is not image:
+            complete = False
+            continue
+        _, filename, colorkey, rect, flags = record
+        key = (filename, colorkey)
+        if key not in source_ids:
+            source_ids[key] = len(image_sources)
+            try:
+                source = os.path.relpath(os.path.abspath(filename), tmx_dir)
+            except ValueError:
+                source = os.path.abspath(filename)
+            image_sources.append([source, colorkey])
+        image_index[gid] = source_ids[key]
+        if rect:
+            image_rects[gid] = rect
+        if flags:
+            image_flags[gid] = (flags.flipped_horizontally, flags.flipped_vertically,
+                                flags.flipped_diagonally)
+        if colorkey:
+            image_modes[gid] = TILE_MODE_COLORKEY
+        elif image.get_flags() & pygame.SRCALPHA:
+            image_modes[gid] = TILE_MODE_ALPHA
+
+    compiled = {
+        'source_hash': map_source_hash(tmx_file, image_sources),
+        'tile_w': tmx.tilewidth,
+        'tile_h': tmx.tileheight,
+        'width': tmx.width,
+        'height': tmx.height,
+        'layers': tile_layer_arrays(tmx),
+        'collision': collision_grid(tmx),
+        'image_index': image_index,
+        'image_rects': image_rects,
+        'image_flags': image_flags,
+        'image_modes': image_modes,
+        'image_colours': image_colours,
+        'image_sources': image_sources,
+        'objects': [MapObject.from_tiled(obj).to_record() for obj in tmx.objects],
+        'properties': dict(tmx.properties),
+        'animations': tile_animations(tmx),
+    }
+    if not complete:
+        print("Some tile images have no known source; not caching this map.")
+    compiled['cacheable'] = complete
+    return compiled
+
+
+def surface_bytes(surface):
+    return surface.get_width() * surface.get_height() * surface.get_bytesize()
+
+
+def convert_tile(tile, mode, colorkey):
+    """Same result as pytmx's smart_convert, minus its per-tile mask scan"""
+    if mode == TILE_MODE_COLORKEY:
+        tile = tile.convert()
+        tile.set_colorkey(pygame.Color(f"#{colorkey}"), pygame.RLEACCEL)
+    elif mode == TILE_MODE_ALPHA:
+        tile = tile.convert_alpha()
+    else:
+        tile = tile.convert()
+    return tile
+
+
+def load_compiled_tile_images(tmx_file, compiled):
+    """Rebuild the gid -> Surface table of a compiled map straight from the tileset images"""
+    tmx_dir = os.path.dirname(os.path.abspath(tmx_file))
+    tilesets = {}
+    image_index = compiled['image_index']
+    images = [None] * len(image_index)
+
+    # Only tiles that are actually placed in a layer need a Surface
+    used_gids = set()
+    for gids in compiled['layers']:
+        used_gids.update(np.unique(gids).tolist())
+    for gid, frames in compiled['animations'].items():
+        if gid in used_gids:
+            used_gids.update(frame_gid for frame_gid, _ in frames)
+
+    for gid in sorted(used_gids):
+        source_index = int(image_index[gid]) if 0 < gid < len(image_index) else -1
+        if source_index < 0:
+            continue
+        source, colorkey = compiled['image_sources'][source_index]
+        tileset = tilesets.get(source_index)
+        if tileset is None:
+            tileset = TILESET_CACHE.get(os.path.join(tmx_dir, source))
+            tilesets[source_index] = tileset
+
+        rect = tuple(compiled['image_rects'][gid].tolist())
+        flags = compiled['image_flags'][gid].tolist()
+        mode = int(compiled['image_modes'][gid])
+        images[gid] = tileset.tile(rect if rect[2] else None, flags, colorkey,
+                                   lambda surface: convert_tile(surface, mode, colorkey))
+    return images
+
+
+# Map object factories: kind -> (GameMap list attribute, factory, respawn).
+# A factory takes (game_map, map_object) and returns the built item or None.
+MAP_OBJECT_FACTORIES = {}
+# Kinds matched as substrings of the object type, e.g. 'npc' matches 'old_npc'
+MAP_OBJECT_KEYWORDS = []
+
+
+def map_object_factory(*kinds, collection, substring=False, respawn=True):
+    """Register a factory for Tiled objects of the given types.
+
+    Built items are collected into GameMap.<collection>. Entities with
+    respawn=True are rebuilt every time the map is entered again; the others
+    (e.g. teleports) are built once per load. Example for a new type:
+
+        @map_object_factory('chest', collection='chests')
+        def make_chest(game_map, obj):
+            return Chest(int(obj.x), int(obj.y), obj.properties.get('item'))
+    """
+    def register(factory):
+        for kind in kinds:
+            entry = (collection, factory, respawn)
+            if substring:
+                MAP_OBJECT_KEYWORDS.append((kind.lower(), entry))
             else:
-                print("No local tileset files found to fix the TMX.\nMake sure your .tsx files are next to the .tmx or adjust paths in the TMX.")
+                MAP_OBJECT_FACTORIES[kind.lower()] = entry
+        return factory
+    return register
+
+
+def map_object_collections():
+    """Every GameMap attribute filled by a registered factory"""
+    entries = list(MAP_OBJECT_FACTORIES.values()) + [e for _, e in MAP_OBJECT_KEYWORDS]
+    return {collection: respawn for collection, _, respawn in entries}
+
+
+def find_map_object_factory(kind):
+    entry = MAP_OBJECT_FACTORIES.get(kind)
+    if entry is None:
+        for keyword, keyword_entry in MAP_OBJECT_KEYWORDS:
+            if keyword in kind:
+                return keyword_entry
+    return entry
+
+
+@map_object_factory('teleport', collection='teleports', respawn=False)
+def make_teleport(game_map, obj):
+    props = obj.properties
+    dest = props.get('dest') or props.get('map') or props.get('destination')
+    rect = pygame.Rect(int(obj.x), int(obj.y), int(obj.width or 1), int(obj.height or 1))
+    return {'rect': rect, 'dest': dest, 'dest_x': props.get('dest_x'),
+            'dest_y': props.get('dest_y'), 'obj': obj}
+
+
+@map_object_factory('spawn_zone', 'slime_spawner', collection='spawn_zones', respawn=False)
+def make_spawn_zone(game_map, obj):
+    return pygame.Rect(int(obj.x), int(obj.y), int(obj.width or 1), int(obj.height or 1))
+
+
+@map_object_factory('light', 'torch', collection='lights', respawn=False)
+def make_light(game_map, obj):
+    colour = parse_colour(obj.properties.get('color'))
+    if colour is None:
+        colour = LIGHT_COLOURS['fire' if obj.kind == 'torch' else 'default']
+    return (obj.x + (obj.width or 0) / 2, obj.y + (obj.height or 0) / 2,
+            int(obj.properties.get('radius', 96)), colour)
+
+
+@map_object_factory('boss', collection='bosses')
+def make_boss(game_map, obj):
+    print(f"Found boss at ({obj.x}, {obj.y})")
+    return Boss(int(obj.x), int(obj.y), game_map.tile_w, game_map.tile_h)
+
+
+@map_object_factory('barman', 'merchant', 'npc', collection='npcs', substring=True)
+def make_npc(game_map, obj):
+    # Custom dialogues come from dialogue1, dialogue2, ... properties
+    custom_dialogues = []
+    i = 1
+    while f'dialogue{i}' in obj.properties:
+        custom_dialogues.append(obj.properties[f'dialogue{i}'])
+        i += 1
+
+    if 'barman' in obj.kind:
+        npc_name = 'barman'
+    elif 'merchant' in obj.kind:
+        npc_name = 'merchant'
+    else:
+        npc_name = obj.type or obj.name
+
+    print(f"Found NPC '{npc_name}' at ({obj.x}, {obj.y})")
+    return NPC(int(obj.x), int(obj.y), game_map.tile_w, game_map.tile_h,
+               npc_name, custom_dialogues if custom_dialogues else None)
+
+
+class GameMap:
+    def __init__(self, tmx_file, use_chunk_cache=True, use_compiled_cache=True, stream=None):
+        self.current_map_file = tmx_file  # Store for tower building
+        compiled = load_compiled_map(
+            tmx_file) if use_compiled_cache else None
+        self.loaded_from_cache = compiled is not None
+
+        if compiled is None:
+            try:
+                tmx_data = load_tmx(tmx_file)
+            except Exception as e:
+                print(f"Error loading TMX file: {e}")
+                print("Run 'python compile_maps.py' to resolve tileset paths and compile the maps.")
                 raise
+            compiled = compile_tmx(tmx_data, tmx_file)
+            if use_compiled_cache and compiled['cacheable']:
+                save_compiled_map(tmx_file, compiled)
+            tile_images = list(tmx_data.images)
+        else:
+            tile_images = load_compiled_tile_images(tmx_file, compiled)
+
+        self.tile_w = compiled['tile_w']
+        self.tile_h = compiled['tile_h']
+        self.width = compiled['width']
+        self.height = compiled['height']
+        self.properties = compiled['properties']
+        # Tileset images the tiles come from; TILESET_CACHE keeps them while a cached map uses them
+        tmx_dir = os.path.dirname(os.path.abspath(tmx_file))
+        self.tileset_paths = {os.path.abspath(os.path.join(tmx_dir, source))
+                              for source, _ in compiled['image_sources']}
+        self.objects = [MapObject(record) for record in compiled['objects']]
+        self.collision_grid = compiled['collision']
+        # Big maps (or maps with a 'stream' property) only keep chunks near the player
+        if stream is None:
+            stream = self.properties.get('stream', self.width * self.height > STREAM_MAP_MIN_TILES)
+        self.streaming = bool(stream) and use_chunk_cache
+        if self.streaming:
+            print(f"Streaming map: {self.width}x{self.height} tiles")
+        else:
+            stats = self.collision_stats()
+            print(f"Collision: {stats['tiles']} blocked tiles -> {stats['rects']} rects")
+        self.build_objects()
+        self.build_spawn_tables()
+        self.towers = self.build_towers()
+        self.build_trigger_index()
+        # Tile -> next tile towards flow_target (None at the target itself)
+        self.flow_target = None
+        self.flow = {}
+        self.los_cache = OrderedDict()
+
+        # Tile layers as gid arrays plus a gid -> Surface lookup table
+        self.tile_layers = compiled['layers']
+        self.tile_images = tile_images
+        max_img_w = max((img.get_width()
+                        for img in self.tile_images if img), default=self.tile_w)
+        max_img_h = max((img.get_height()
+                        for img in self.tile_images if img), default=self.tile_h)
+        # How many tiles an oversized tile image can spill right/down
+        self.tile_overhang_x = max(0, -(-max_img_w // self.tile_w) - 1)
+        self.tile_overhang_y = max(0, -(-max_img_h // self.tile_h) - 1)
+
+        # gid -> (frame images, frame end times in ms, loop length); tile_images holds
+        # the current frame of each animated gid
+        self.animations = {}
+        for gid, frames in compiled['animations'].items():
+            if gid < len(self.tile_images):
+                ends = list(np.cumsum([duration for _, duration in frames]).tolist())
+                images = [self.tile_images[frame_gid] for frame_gid, _ in frames]
+                self.animations[gid] = (images, ends, ends[-1])
+                self.tile_images[gid] = images[0]
+        self.animation_frames = dict.fromkeys(self.animations, 0)
+        self.animated_cells = self.find_animated_cells()
+
+        # Fog of war (maps can turn it off with a 'fog' property): explored tiles,
+        # and the overlay covering tile window fog_window at fog_zoom
+        self.fog = bool(self.properties.get('fog', True))
+        self.explored = np.zeros((self.height, self.width), dtype=bool)
+        self.fog_tile = None
+        self.fog_overlay = None
+        self.fog_window = None
+        self.fog_zoom = None
+        # Bumped whenever tiles get explored
+        self.fog_version = 0
+
+        # Lighting: ambient colour (None for daylight maps, which skip lighting),
+        # and the lightmap with the static lights baked in for the towers standing
+        self.ambient = parse_colour(self.properties.get('ambient'))
+        if self.ambient is None and self.properties.get('boss_room'):
+            self.ambient = BOSS_ROOM_AMBIENT
+        self.lightmap = None
+        self.lightmap_towers = None
+        self.unbaked_lights = []
+        # Lightmap texels (x0, y0, x1, y1) around the view, scaled to the screen at light_zoom
+        self.light_window = None
+        self.light_zoom = None
+        self.light_scaled = None
+        self.light_buffer = None
+        # (thumbnail, minimap pixels per world pixel), built on first use
+        self.minimap = None
+        self.tile_colours = compiled['image_colours']
+
+        self.chunk_w = TILE_CHUNK_SIZE * self.tile_w
+        self.chunk_h = TILE_CHUNK_SIZE * self.tile_h
+        self.chunk_cols = -(-self.width // TILE_CHUNK_SIZE)
+        self.chunk_rows = -(-self.height // TILE_CHUNK_SIZE)
+        self.visible_chunks = set()
+        # zoom -> gid -> scaled tile, and (zoom, cx, cy) -> scaled chunk (LRU)
+        self.scaled_tile_images = {}
+        self.scaled_chunks = OrderedDict()
+        self.scaled_chunk_bytes = 0
+        if not use_chunk_cache:
+            self.chunks = None
+        elif self.streaming:
+            # (cx, cy) -> Surface, or None for a loaded chunk without tiles
+            self.chunks = {}
+        else:
+            self.chunks = self.build_chunks()
 
-        self.tile_w = self.tmx_data.tilewidth
-        self.tile_h = self.tmx_data.tileheight
-        self.width = self.tmx_data.width
-        self.height = self.tmx_data.height
-        self.collision_rects = self.build_collision_rects()
-        self.teleports = self.build_teleports()
-        self.bosses = self.build_bosses()
+    def spawn_entities(self):
+        """(Re)create the bosses, towers, NPCs and other respawning objects of this map"""
+        self.build_objects(respawn_only=True)
         self.towers = self.build_towers()
-        self.npcs = self.build_npcs()
+        self.build_trigger_index()
 
-    def build_collision_rects(self):
+    def build_trigger_index(self):
+        """Bucket the teleport rects and NPC talk ranges into a coarse grid for triggers_at"""
+        zones = [(rect, 'teleport', tp) for tp in self.teleports
+                 for rect in [tp.get('rect')] if rect]
+        for npc in self.npcs:
+            r = npc.interaction_range
+            zones.append((pygame.Rect(int(npc.pixel_x) - r, int(npc.pixel_y) - r, 2 * r + 1, 2 * r + 1),
+                          'npc', npc))
+        self.trigger_buckets = {}
+        s = TRIGGER_BUCKET_SIZE
+        for order, (rect, kind, item) in enumerate(zones):
+            for by in range(rect.top // s, (rect.bottom - 1) // s + 1):
+                for bx in range(rect.left // s, (rect.right - 1) // s + 1):
+                    self.trigger_buckets.setdefault((bx, by), []).append((order, rect, kind, item))
+
+    def triggers_at(self, rect, kind=None):
+        """Items of the trigger zones ('teleport' or 'npc') overlapping rect, in map order"""
+        s = TRIGGER_BUCKET_SIZE
+        found = {}
+        for by in range(rect.top // s, (rect.bottom - 1) // s + 1):
+            for bx in range(rect.left // s, (rect.right - 1) // s + 1):
+                for order, zone, zone_kind, item in self.trigger_buckets.get((bx, by), ()):
+                    if (kind is None or zone_kind == kind) and zone.colliderect(rect):
+                        found[order] = item
+        return [found[order] for order in sorted(found)]
+
+    def build_objects(self, respawn_only=False):
+        """Build every registered object type in one pass over the object layer"""
+        collections = {name: [] for name, respawn in map_object_collections().items()
+                       if respawn or not respawn_only}
+        for obj in self.objects:
+            entry = find_map_object_factory(obj.kind)
+            if entry is None or entry[0] not in collections:
+                continue
+            collection, factory, _ = entry
+            try:
+                item = factory(self, obj)
+            except Exception as e:
+                print(f"Error loading {collection} object {obj.id}: {e}")
+                continue
+            if item is not None:
+                collections[collection].append(item)
+        for name, items in collections.items():
+            setattr(self, name, items)
+
+    def memory_footprint(self):
+        """Approximate bytes held by this map's chunk surfaces.
+
+        Tile images are shared through TILESET_CACHE and reported there."""
+        chunks = [chunk for chunk in (self.chunks or {}).values() if chunk]
+        overlays = [self.fog_overlay, self.lightmap, self.minimap and self.minimap[0]]
+        overlay_bytes = sum(surface_bytes(overlay) for overlay in overlays if overlay)
+        return self.scaled_chunk_bytes + overlay_bytes + sum(surface_bytes(chunk) for chunk in chunks)
+
+    def build_collision_rects(self, tx0=0, ty0=0, tx1=None, ty1=None):
+        """Merge the blocked tiles (of the given tile window) into as few rectangles as possible.
+
+        Each blocked tile is covered exactly once: runs of tiles are grown to
+        the right, then downwards while the whole run below is still free."""
+        grid = self.collision_grid[ty0:ty1, tx0:tx1]
+        height, width = grid.shape
+        used = np.zeros_like(grid)
         rects = []
-        layers = list(self.tmx_data.visible_layers)
-
-        if layers:
-            bottom_layer = layers[0]
-            if isinstance(bottom_layer, pytmx.TiledTileLayer):
-                if bottom_layer.properties.get("blocked") or bottom_layer.name.lower() == "collision":
-                    for x, y, gid in bottom_layer.tiles():
-                        if gid != 0:
-                            rects.append(pygame.Rect(x * self.tmx_data.tilewidth, y * self.tmx_data.tileheight,
-                                                     self.tmx_data.tilewidth, self.tmx_data.tileheight))
-                    return rects
-
-        try:
-            collision_layer = self.tmx_data.get_layer_by_name("collision")
-            if collision_layer and collision_layer.properties.get("blocked"):
-                for x, y, gid in collision_layer.tiles():
-                    if gid != 0:
-                        rects.append(pygame.Rect(x * self.tmx_data.tilewidth, y * self.tmx_data.tileheight,
-                                                 self.tmx_data.tilewidth, self.tmx_data.tileheight))
-        except Exception as e:
-            print(f"Warning: Could not load collision layer: {e}")
-
-        for layer in self.tmx_data.visible_layers:
-            if isinstance(layer, pytmx.TiledTileLayer):
-                if layer.properties.get("blocked"):
-                    for x, y, gid in layer.tiles():
-                        if gid != 0:
-                            rects.append(pygame.Rect(x * self.tmx_data.tilewidth, y * self.tmx_data.tileheight,
-                                                     self.tmx_data.tilewidth, self.tmx_data.tileheight))
+        ys, xs = np.nonzero(grid)
+        for x, y in zip(xs.tolist(), ys.tolist()):
+            if used[y, x]:
+                continue
+            x1 = x + 1
+            while x1 < width and grid[y, x1] and not used[y, x1]:
+                x1 += 1
+            y1 = y + 1
+            while y1 < height and grid[y1, x:x1].all() and not used[y1, x:x1].any():
+                y1 += 1
+            used[y:y1, x:x1] = True
+            rects.append(pygame.Rect((tx0 + x) * self.tile_w, (ty0 + y) * self.tile_h,
+                                     (x1 - x) * self.tile_w, (y1 - y) * self.tile_h))
         return rects
 
-    def build_teleports(self):
-        teleports = []
-        try:
-            for obj in getattr(self.tmx_data, 'objects', []):
-                obj_type = getattr(obj, 'type', '') or getattr(obj, 'name', '')
-                if str(obj_type).lower() == 'teleport':
-                    props = getattr(obj, 'properties', {}) or {}
-                    dest = props.get('dest') or props.get(
-                        'map') or props.get('destination')
-                    dest_x = props.get('dest_x')
-                    dest_y = props.get('dest_y')
-                    rect = pygame.Rect(int(obj.x), int(obj.y), int(getattr(obj, 'width', 0) or 1),
-                                       int(getattr(obj, 'height', 0) or 1))
-                    teleports.append(
-                        {'rect': rect, 'dest': dest, 'dest_x': dest_x, 'dest_y': dest_y, 'obj': obj})
-        except Exception:
-            pass
-        return teleports
-
-    def build_bosses(self):
-        bosses = []
-        try:
-            for obj in getattr(self.tmx_data, 'objects', []):
-                obj_type = getattr(obj, 'type', '') or getattr(obj, 'name', '')
-                if str(obj_type).lower() == 'boss':
-                    boss = Boss(int(obj.x), int(obj.y),
-                                self.tile_w, self.tile_h)
-                    bosses.append(boss)
-                    print(f"Found boss at ({obj.x}, {obj.y})")
-        except Exception as e:
-            print(f"Error loading bosses: {e}")
-        return bosses
+    def rect_blocked(self, rect):
+        """True if rect overlaps a blocked tile; only the tiles under rect are checked"""
+        tx0 = max(0, rect.left // self.tile_w)
+        ty0 = max(0, rect.top // self.tile_h)
+        tx1 = min(self.width, (rect.right - 1) // self.tile_w + 1)
+        ty1 = min(self.height, (rect.bottom - 1) // self.tile_h + 1)
+        if tx0 >= tx1 or ty0 >= ty1:
+            return False
+        return bool(self.collision_grid[ty0:ty1, tx0:tx1].any())
+
+    def window_counts(self, grid, fw, fh):
+        """Number of True tiles in every fw x fh window of grid, indexed by its top-left tile"""
+        integral = np.zeros((self.height + 1, self.width + 1), dtype=np.int32)
+        integral[1:, 1:] = grid.cumsum(0, dtype=np.int32).cumsum(1, dtype=np.int32)
+        return (integral[fh:, fw:] - integral[:-fh, fw:]
+                - integral[fh:, :-fw] + integral[:-fh, :-fw])
+
+    def spawn_area(self, fw, fh):
+        """Top-left tiles allowed for random spawns: inside a spawn zone if the map has
+        any, otherwise anywhere SPAWN_MARGIN_TILES away from the edge"""
+        area = np.zeros((self.height, self.width), dtype=bool)
+        if self.spawn_zones:
+            # Tiles lying completely inside a zone
+            in_zone = np.zeros_like(area)
+            for zone in self.spawn_zones:
+                tx0 = -(-zone.left // self.tile_w)
+                ty0 = -(-zone.top // self.tile_h)
+                in_zone[max(0, ty0):zone.bottom // self.tile_h,
+                        max(0, tx0):zone.right // self.tile_w] = True
+            outside = self.window_counts(~in_zone, fw, fh)
+            area[:outside.shape[0], :outside.shape[1]] = outside == 0
+            if area.any():
+                return area
+            print("Spawn zones are too small or outside the map; spawning anywhere")
+        area[SPAWN_MARGIN_TILES:self.height - SPAWN_MARGIN_TILES + 1,
+             SPAWN_MARGIN_TILES:self.width - SPAWN_MARGIN_TILES + 1] = True
+        return area
+
+    def build_spawn_table(self, fw, fh):
+        """Tabulate where an fw x fh tile footprint fits without touching a blocked tile"""
+        fits = np.zeros((self.height, self.width), dtype=bool)
+        if fw <= self.width and fh <= self.height:
+            blocked = self.window_counts(self.collision_grid, fw, fh)
+            fits[:blocked.shape[0], :blocked.shape[1]] = blocked == 0
+        ys, xs = np.nonzero(fits & self.spawn_area(fw, fh))
+        self.spawn_tables[(fw, fh)] = (fits, np.stack([xs, ys], axis=1))
+
+    def build_spawn_tables(self):
+        self.spawn_tables = {}
+        for fw, fh in SPAWN_FOOTPRINTS:
+            self.build_spawn_table(fw, fh)
+
+    def footprint_fits(self, tx, ty, fw, fh):
+        """True if an fw x fh tile footprint with top-left tile (tx, ty) is free"""
+        if (fw, fh) not in self.spawn_tables:
+            self.build_spawn_table(fw, fh)
+        fits = self.spawn_tables[(fw, fh)][0]
+        return 0 <= tx < self.width and 0 <= ty < self.height and bool(fits[ty, tx])
+
+    def random_spawn_tile(self, fw, fh):
+        """Uniformly pick a free spawn position for an fw x fh footprint; None if there is none"""
+        if (fw, fh) not in self.spawn_tables:
+            self.build_spawn_table(fw, fh)
+        cells = self.spawn_tables[(fw, fh)][1]
+        if not len(cells):
+            return None
+        tx, ty = cells[random.randrange(len(cells))].tolist()
+        return tx, ty
+
+    def update_flow_field(self, target_x, target_y):
+        """Point every free tile within FLOW_FIELD_RANGE at the next tile on a shortest
+        path to world pixel (target_x, target_y); only recomputed when its tile changes"""
+        target = (int(target_x) // self.tile_w, int(target_y) // self.tile_h)
+        if target == self.flow_target:
+            return
+        self.flow_target = target
+        radius = max(1, FLOW_FIELD_RANGE // min(self.tile_w, self.tile_h))
+        x0 = max(0, target[0] - radius)
+        y0 = max(0, target[1] - radius)
+        blocked = self.collision_grid[y0:target[1] + radius + 1, x0:target[0] + radius + 1].tolist()
+        rows, cols = len(blocked), len(blocked[0]) if blocked else 0
+
+        def free(x, y):
+            return 0 <= x - x0 < cols and 0 <= y - y0 < rows and not blocked[y - y0][x - x0]
+
+        flow = {target: None}
+        frontier = [target] if free(*target) else []
+        for _ in range(radius):
+            next_frontier = []
+            for x, y in frontier:
+                for dx, dy in FLOW_NEIGHBOURS:
+                    nx, ny = x + dx, y + dy
+                    if (nx, ny) in flow or not free(nx, ny):
+                        continue
+                    # No cutting corners: both tiles beside a diagonal step must be free
+                    if dx and dy and not (free(x, ny) and free(nx, y)):
+                        continue
+                    flow[(nx, ny)] = (x, y)
+                    next_frontier.append((nx, ny))
+            frontier = next_frontier
+        self.flow = flow
+
+    def flow_step(self, x, y):
+        """World pixel of the next tile to walk to from pixel (x, y), or None if (x, y) is
+        on the target tile or out of the flow field's reach"""
+        step = self.flow.get((int(x) // self.tile_w, int(y) // self.tile_h))
+        if step is None:
+            return None
+        return step[0] * self.tile_w, step[1] * self.tile_h
+
+    def line_of_sight(self, a, b):
+        """True if no blocked tile lies between world pixels a and b (the two end tiles
+        themselves don't count). Cached per (source tile, target tile)."""
+        source = (min(max(int(a[0]) // self.tile_w, 0), self.width - 1),
+                  min(max(int(a[1]) // self.tile_h, 0), self.height - 1))
+        target = (min(max(int(b[0]) // self.tile_w, 0), self.width - 1),
+                  min(max(int(b[1]) // self.tile_h, 0), self.height - 1))
+        key = (source, target)
+        visible = self.los_cache.get(key)
+        if visible is not None:
+            self.los_cache.move_to_end(key)
+            return visible
+
+        visible = self.cast_ray(source, target)
+        self.los_cache[key] = visible
+        if len(self.los_cache) > LOS_CACHE_SIZE:
+            self.los_cache.popitem(last=False)
+        return visible
+
+    def cast_ray(self, source, target):
+        """DDA walk over the tiles crossed by the line between two tile centres"""
+        x, y = source
+        tx, ty = target
+        dx, dy = tx - x, ty - y
+        step_x = (dx > 0) - (dx < 0)
+        step_y = (dy > 0) - (dy < 0)
+        # Ray parameter (0 at source, 1 at target) between tile borders; starts mid-tile
+        delta_x = 1 / abs(dx) if dx else math.inf
+        delta_y = 1 / abs(dy) if dy else math.inf
+        next_x = delta_x / 2
+        next_y = delta_y / 2
+        grid = self.collision_grid
+
+        while (x, y) != (tx, ty):
+            if next_x < next_y:
+                x += step_x
+                next_x += delta_x
+            elif next_y < next_x:
+                y += step_y
+                next_y += delta_y
+            else:
+                # Exactly through a tile corner: a wall on either side blocks the view
+                if ((x + step_x, y) != target and grid[y, x + step_x]) or \
+                        ((x, y + step_y) != target and grid[y + step_y, x]):
+                    return False
+                x += step_x
+                y += step_y
+                next_x += delta_x
+                next_y += delta_y
+            if (x, y) != (tx, ty) and grid[y, x]:
+                return False
+        return True
+
+    def collision_stats(self):
+        """Blocked tile count vs. merged collision rectangle count (merged on every call;
+        collision checks use collision_grid)"""
+        return {'tiles': int(self.collision_grid.sum()), 'rects': len(self.build_collision_rects())}
 
     def build_towers(self):
         """Build towers by scanning for tower images in the image folder and placing them on the map"""
@@ -1380,9 +2275,7 @@ class GameMap:
                     y_pixel = config['y'] * self.tile_h
 
                     # Check if location is not in collision
-                    test_rect = pygame.Rect(
-                        x_pixel, y_pixel, self.tile_w * 3, self.tile_h * 3)
-                    if not any(test_rect.colliderect(r) for r in self.collision_rects):
+                    if self.footprint_fits(config['x'], config['y'], 3, 3):
                         tower = Tower(x_pixel, y_pixel, self.tile_w,
                                       self.tile_h, tower_type)
                         towers.append(tower)
@@ -1394,93 +2287,753 @@ class GameMap:
 
         return towers
 
-    def build_npcs(self):
-        npcs = []
-        try:
-            for obj in getattr(self.tmx_data, 'objects', []):
-                obj_type = getattr(obj, 'type', '') or getattr(obj, 'name', '')
-                obj_type_lower = str(obj_type).lower()
-
-                # Check if it's an NPC object
-                if 'npc' in obj_type_lower or 'barman' in obj_type_lower or 'merchant' in obj_type_lower:
-                    # Get custom dialogues from properties if available
-                    props = getattr(obj, 'properties', {}) or {}
-                    custom_dialogues = []
-
-                    # Check for dialogue properties (dialogue1, dialogue2, etc.)
-                    i = 1
-                    while True:
-                        dialogue_key = f'dialogue{i}'
-                        if dialogue_key in props:
-                            custom_dialogues.append(props[dialogue_key])
-                            i += 1
-                        else:
-                            break
+    def render_tiles(self, surface, tx0, ty0, tx1, ty1, origin_x, origin_y, zoom=1):
+        """Blit tiles in columns tx0..tx1 and rows ty0..ty1 (exclusive) onto surface,
+        whose top-left corner sits at world pixel (origin_x, origin_y) times zoom.
+        Returns the number of tiles blitted."""
+        # Oversized tiles left of / above the window can still reach into it
+        tx0 = max(0, tx0 - self.tile_overhang_x)
+        ty0 = max(0, ty0 - self.tile_overhang_y)
+        tx1 = min(self.width, tx1)
+        ty1 = min(self.height, ty1)
+        if tx0 >= tx1 or ty0 >= ty1:
+            return 0
+
+        images = self.tile_images if zoom == 1 else self.scaled_tiles(zoom)
+        tile_w = int(self.tile_w * zoom)
+        tile_h = int(self.tile_h * zoom)
+        base_x = tx0 * tile_w - origin_x
+        base_y = ty0 * tile_h - origin_y
+        count = 0
+        for gids in self.tile_layers:
+            window = gids[ty0:ty1, tx0:tx1]
+            ys, xs = np.nonzero(window)
+            if not len(ys):
+                continue
+            blits = []
+            for y, x, gid in zip(ys.tolist(), xs.tolist(), window[ys, xs].tolist()):
+                image = images[gid]
+                if image is None and zoom != 1:
+                    source = self.tile_images[gid]
+                    image = images[gid] = scaled_sprite(source, zoom) if source else False
+                if image:
+                    blits.append((image, (base_x + x * tile_w,
+                                          base_y + y * tile_h)))
+            surface.blits(blits, False)
+            count += len(blits)
+        return count
+
+    def render_chunk(self, cx, cy):
+        """Render chunk (cx, cy) of the tile layers; None if it has no tiles"""
+        chunk = pygame.Surface((self.chunk_w, self.chunk_h), pygame.SRCALPHA)
+        tx0 = cx * TILE_CHUNK_SIZE
+        ty0 = cy * TILE_CHUNK_SIZE
+        if self.render_tiles(chunk, tx0, ty0, tx0 + TILE_CHUNK_SIZE, ty0 + TILE_CHUNK_SIZE,
+                             cx * self.chunk_w, cy * self.chunk_h):
+            return chunk.convert_alpha()
+        return None
 
-                    # Determine NPC name
-                    npc_name = 'barman'  # default
-                    if 'barman' in obj_type_lower:
-                        npc_name = 'barman'
-                    elif 'merchant' in obj_type_lower:
-                        npc_name = 'merchant'
-                    else:
-                        npc_name = obj_type
+    def find_animated_cells(self):
+        """(cx, cy) -> {gid: [(tx, ty), ...]} for every placed animated tile"""
+        cells = {}
+        if not self.animations:
+            return cells
+        animated = np.array(list(self.animations), dtype=np.int32)
+        for gids in self.tile_layers:
+            ys, xs = np.nonzero(np.isin(gids, animated))
+            for x, y, gid in zip(xs.tolist(), ys.tolist(), gids[ys, xs].tolist()):
+                key = (x // TILE_CHUNK_SIZE, y // TILE_CHUNK_SIZE)
+                cells.setdefault(key, {}).setdefault(gid, []).append((x, y))
+        return cells
+
+    def update_animations(self, now):
+        """Show the animation frames for clock time now (ms), redrawing only the
+        chunk cells whose animated tile changed frame. Returns the world pixel
+        rects that changed, one per chunk."""
+        changed = set()
+        for gid, (images, ends, total) in self.animations.items():
+            index = bisect.bisect_right(ends, now % total)
+            if index != self.animation_frames[gid]:
+                self.animation_frames[gid] = index
+                self.tile_images[gid] = images[index]
+                for scaled in self.scaled_tile_images.values():
+                    scaled[gid] = None
+                changed.add(gid)
+        if not changed:
+            return []
 
-                    npc = NPC(int(obj.x), int(obj.y), self.tile_w, self.tile_h,
-                              npc_name, custom_dialogues if custom_dialogues else None)
-                    npcs.append(npc)
-                    print(f"Found NPC '{npc_name}' at ({obj.x}, {obj.y})")
-        except Exception as e:
-            print(f"Error loading NPCs: {e}")
-        return npcs
+        rects = []
+        # Oversized tiles also cover the cells right of / below their own
+        span_x = self.tile_overhang_x + 1
+        span_y = self.tile_overhang_y + 1
+        for key, cells_by_gid in self.animated_cells.items():
+            cells = [cell for gid in changed for cell in cells_by_gid.get(gid, ())]
+            if not cells:
+                continue
+            xs = [x for x, _ in cells]
+            ys = [y for _, y in cells]
+            rects.append(pygame.Rect(min(xs) * self.tile_w, min(ys) * self.tile_h,
+                                     (max(xs) - min(xs) + span_x) * self.tile_w,
+                                     (max(ys) - min(ys) + span_y) * self.tile_h))
+            chunk = self.chunks.get(key) if self.chunks is not None else None
+            if chunk:
+                self.redraw_cells(key, chunk, cells)
+                for zoom in ZOOM_LEVELS:
+                    self.drop_scaled_chunk((zoom,) + key)
+        return rects
+
+    def redraw_cells(self, key, chunk, cells):
+        """Re-render the given tiles (and whatever overlaps them) inside one chunk"""
+        tx0 = key[0] * TILE_CHUNK_SIZE
+        ty0 = key[1] * TILE_CHUNK_SIZE
+        origin_x = key[0] * self.chunk_w
+        origin_y = key[1] * self.chunk_h
+        # An oversized tile reaches into the cells right of / below it, and
+        # render_tiles also scans that far left of / above each window
+        span_x = self.tile_overhang_x + 1
+        span_y = self.tile_overhang_y + 1
+        cell_cost = (span_x + self.tile_overhang_x) * (span_y + self.tile_overhang_y)
+        chunk_cost = (TILE_CHUNK_SIZE + self.tile_overhang_x) * (TILE_CHUNK_SIZE + self.tile_overhang_y)
+        if len(cells) * cell_cost >= chunk_cost:
+            chunk.fill((0, 0, 0, 0))
+            self.render_tiles(chunk, tx0, ty0, tx0 + TILE_CHUNK_SIZE, ty0 + TILE_CHUNK_SIZE,
+                              origin_x, origin_y)
+            return
+
+        for tx, ty in cells:
+            rect = pygame.Rect(tx * self.tile_w - origin_x, ty * self.tile_h - origin_y,
+                               span_x * self.tile_w, span_y * self.tile_h)
+            chunk.set_clip(rect)
+            chunk.fill((0, 0, 0, 0), rect)
+            self.render_tiles(chunk, tx, ty, tx + span_x, ty + span_y, origin_x, origin_y)
+        chunk.set_clip(None)
+
+    def scaled_tiles(self, zoom):
+        """gid -> tile Surface scaled by zoom; filled in by render_tiles as tiles come into view"""
+        images = self.scaled_tile_images.get(zoom)
+        if images is None:
+            images = self.scaled_tile_images[zoom] = [None] * len(self.tile_images)
+        return images
+
+    def scaled_chunk(self, cx, cy, zoom):
+        """Chunk (cx, cy) scaled by zoom, kept in a byte-bounded LRU"""
+        key = (zoom, cx, cy)
+        scaled = self.scaled_chunks.get(key)
+        if scaled is not None:
+            self.scaled_chunks.move_to_end(key)
+            return scaled
+        scaled = pygame.transform.scale(
+            self.chunks[(cx, cy)], (int(self.chunk_w * zoom), int(self.chunk_h * zoom)))
+        self.scaled_chunks[key] = scaled
+        self.scaled_chunk_bytes += surface_bytes(scaled)
+        while self.scaled_chunk_bytes > ZOOM_CHUNK_CACHE_BYTES and len(self.scaled_chunks) > 1:
+            self.drop_scaled_chunk(next(iter(self.scaled_chunks)))
+        return scaled
+
+    def drop_scaled_chunk(self, key):
+        scaled = self.scaled_chunks.pop(key, None)
+        if scaled is not None:
+            self.scaled_chunk_bytes -= surface_bytes(scaled)
+
+    def build_chunks(self):
+        """Render the tile layers once into chunk surfaces keyed by (cx, cy)"""
+        chunks = {}
+        for cy in range(self.chunk_rows):
+            for cx in range(self.chunk_cols):
+                chunk = self.render_chunk(cx, cy)
+                if chunk:
+                    chunks[(cx, cy)] = chunk
+        return chunks
+
+    def load_chunk(self, cx, cy):
+        """Streaming mode: render chunk (cx, cy)"""
+        if not (0 <= cx < self.chunk_cols and 0 <= cy < self.chunk_rows):
+            return
+        self.chunks[(cx, cy)] = self.render_chunk(cx, cy)
+
+    def stream_chunks(self, x, y, budget=STREAM_CHUNKS_PER_FRAME):
+        """Streaming mode: keep the chunks around world pixel (x, y) resident.
 
-    def draw(self, surface, camera_x, camera_y):
-        for layer in self.tmx_data.visible_layers:
-            if isinstance(layer, pytmx.TiledTileLayer):
-                for x, y, image in layer.tiles():
-                    if image:
-                        surface.blit(
-                            image, (x*self.tile_w - camera_x, y*self.tile_h - camera_y))
+        Renders at most budget missing chunks per call, nearest first, and
+        evicts chunks that are out of range and not on screen."""
+        if not self.streaming:
+            return
+        center_cx = int(x) // self.chunk_w
+        center_cy = int(y) // self.chunk_h
+        radius = -(-STREAM_RADIUS_TILES // TILE_CHUNK_SIZE)
+
+        # One extra chunk of slack so walking along a chunk border doesn't thrash
+        evicted = [key for key in self.chunks
+                   if max(abs(key[0] - center_cx), abs(key[1] - center_cy)) > radius + 1
+                   and key not in self.visible_chunks]
+        for key in evicted:
+            del self.chunks[key]
+            for zoom in ZOOM_LEVELS:
+                self.drop_scaled_chunk((zoom,) + key)
+
+        missing = [(cx, cy)
+                   for cy in range(max(0, center_cy - radius), min(self.chunk_rows, center_cy + radius + 1))
+                   for cx in range(max(0, center_cx - radius), min(self.chunk_cols, center_cx + radius + 1))
+                   if (cx, cy) not in self.chunks]
+        missing.sort(key=lambda key: abs(key[0] - center_cx) + abs(key[1] - center_cy))
+        for cx, cy in missing[:budget]:
+            self.load_chunk(cx, cy)
+
+    def draw(self, surface, camera_x, camera_y, zoom=1):
+        """Draw the part of the map inside the camera view, scaled by zoom"""
+        camera_x = int(camera_x)
+        camera_y = int(camera_y)
+        view_w = int(surface.get_width() / zoom)
+        view_h = int(surface.get_height() / zoom)
+        # Camera position in zoomed pixels; everything is placed relative to it
+        origin_x = math.floor(camera_x * zoom)
+        origin_y = math.floor(camera_y * zoom)
+
+        if self.chunks is None:
+            # No chunk cache: slice just the on-screen rows and columns
+            self.render_tiles(surface, camera_x // self.tile_w, camera_y // self.tile_h,
+                              (camera_x + view_w) // self.tile_w + 1,
+                              (camera_y + view_h) // self.tile_h + 1,
+                              origin_x, origin_y, zoom)
+            return
+
+        first_cx = camera_x // self.chunk_w
+        first_cy = camera_y // self.chunk_h
+        last_cx = (camera_x + view_w) // self.chunk_w
+        last_cy = (camera_y + view_h) // self.chunk_h
+        scale_budget = ZOOM_SCALE_PIXELS_PER_FRAME
+
+        if self.streaming:
+            self.visible_chunks = {(cx, cy) for cy in range(first_cy, last_cy + 1)
+                                   for cx in range(first_cx, last_cx + 1)}
+        for cy in range(first_cy, last_cy + 1):
+            for cx in range(first_cx, last_cx + 1):
+                if self.streaming and (cx, cy) not in self.chunks:
+                    self.load_chunk(cx, cy)
+                chunk = self.chunks.get((cx, cy))
+                if not chunk:
+                    continue
+                pos = (int(cx * self.chunk_w * zoom) - origin_x,
+                       int(cy * self.chunk_h * zoom) - origin_y)
+                if zoom != 1:
+                    if (zoom, cx, cy) not in self.scaled_chunks and scale_budget <= 0:
+                        # Not scaled yet: draw this chunk straight from scaled tiles for now
+                        clip = surface.get_clip()
+                        surface.set_clip(pygame.Rect(
+                            pos, (int(self.chunk_w * zoom), int(self.chunk_h * zoom))).clip(clip))
+                        tx0 = cx * TILE_CHUNK_SIZE
+                        ty0 = cy * TILE_CHUNK_SIZE
+                        self.render_tiles(surface, tx0, ty0, tx0 + TILE_CHUNK_SIZE,
+                                          ty0 + TILE_CHUNK_SIZE, origin_x, origin_y, zoom)
+                        surface.set_clip(clip)
+                        continue
+                    if (zoom, cx, cy) not in self.scaled_chunks:
+                        scale_budget -= int(self.chunk_w * zoom) * int(self.chunk_h * zoom)
+                    chunk = self.scaled_chunk(cx, cy, zoom)
+                surface.blit(chunk, pos)
+
+    def reveal(self, x, y):
+        """Explore the tiles around world pixel (x, y), clearing them from the fog overlay"""
+        tx = int(x // self.tile_w)
+        ty = int(y // self.tile_h)
+        if not self.fog or (tx, ty) == self.fog_tile:
+            return
+        self.fog_tile = (tx, ty)
+        r = FOG_REVEAL_RADIUS
+        x0, y0 = max(0, tx - r), max(0, ty - r)
+        x1, y1 = min(self.width, tx + r + 1), min(self.height, ty + r + 1)
+        if x0 >= x1 or y0 >= y1:
+            return
+        window = self.explored[y0:y1, x0:x1]
+        new = FOG_REVEAL_MASK[y0 - ty + r:y1 - ty + r, x0 - tx + r:x1 - tx + r] & ~window
+        if not new.any():
+            return
+        window |= new
+        self.fog_version += 1
+
+        if self.fog_overlay is None:
+            return
+        wx0, wy0, wx1, wy1 = self.fog_window
+        tile_w = int(self.tile_w * self.fog_zoom)
+        tile_h = int(self.tile_h * self.fog_zoom)
+        ys, xs = np.nonzero(new)
+        for x, y in zip((xs + x0).tolist(), (ys + y0).tolist()):
+            if wx0 <= x < wx1 and wy0 <= y < wy1:
+                self.fog_overlay.fill((0, 0, 0, 0), ((x - wx0) * tile_w, (y - wy0) * tile_h,
+                                                     tile_w, tile_h))
+
+    def static_lights(self):
+        """Lights that never move: light objects of the map and the towers still standing"""
+        lights = list(self.lights)
+        for tower in self.towers:
+            if tower.state != State.DEAD:
+                lights.append((tower.pixel_x + tower.render_w / 2,
+                               tower.pixel_y + tower.render_h / 4, TOWER_LIGHT_RADIUS,
+                               LIGHT_COLOURS.get(tower.tower_type, LIGHT_COLOURS['default'])))
+        return lights
+
+    def bake_lightmap(self):
+        """Bake the static lights over the ambient colour for the whole map"""
+        lights = self.static_lights()
+        self.light_window = None
+        size = (-(-self.width * self.tile_w // LIGHTMAP_SCALE),
+                -(-self.height * self.tile_h // LIGHTMAP_SCALE))
+        if size[0] * size[1] > LIGHTMAP_MAX_TEXELS:
+            self.lightmap = None
+            self.unbaked_lights = lights
+            return
+        self.lightmap = pygame.Surface(size)
+        self.lightmap.fill(self.ambient)
+        add_lights(self.lightmap, lights, 0, 0)
+        self.unbaked_lights = []
+
+    def light_texels(self, x0, y0, x1, y1):
+        """Static lighting of lightmap texels x0..x1, y0..y1 (exclusive), unscaled"""
+        texels = pygame.Surface((x1 - x0, y1 - y0))
+        texels.fill(self.ambient)
+        if self.lightmap:
+            texels.blit(self.lightmap, (0, 0), (x0, y0, x1 - x0, y1 - y0))
+        add_lights(texels, self.unbaked_lights, x0, y0)
+        return texels
+
+    def scale_light_window(self, x0, y0, x1, y1, zoom):
+        """Scale the static lighting of lightmap texels x0..x1, y0..y1 to the screen at zoom"""
+        s = LIGHTMAP_SCALE
+        self.light_scaled = pygame.transform.smoothscale(
+            self.light_texels(x0, y0, x1, y1), (int((x1 - x0) * s * zoom), int((y1 - y0) * s * zoom)))
+        self.light_window = (x0, y0, x1, y1)
+        self.light_zoom = zoom
+
+    def move_light_window(self, x0, y0):
+        """Move the scaled window to start at texel (x0, y0): light_scaled is scrolled
+        along and only the newly exposed texel strips are scaled"""
+        wx0, wy0, wx1, wy1 = self.light_window
+        dx, dy = x0 - wx0, y0 - wy0
+        cols, rows = wx1 - wx0, wy1 - wy0
+        texel = LIGHTMAP_SCALE * self.light_zoom
+        if texel != int(texel) or abs(dx) >= cols or abs(dy) >= rows:
+            # Texels not a whole number of pixels wide can't be scrolled exactly
+            self.scale_light_window(x0, y0, x0 + cols, y0 + rows, self.light_zoom)
+            return
+        texel = int(texel)
+        self.light_scaled.scroll(-dx * texel, -dy * texel)
+        x1, y1 = x0 + cols, y0 + rows
+        self.light_window = (x0, y0, x1, y1)
+        if dx:
+            self.scale_light_strip(x1 - dx if dx > 0 else x0, y0, x1 if dx > 0 else x0 - dx, y1, texel)
+        if dy:
+            self.scale_light_strip(x0, y1 - dy if dy > 0 else y0, x1, y1 if dy > 0 else y0 - dy, texel)
+
+    def scale_light_strip(self, x0, y0, x1, y1, texel):
+        """Rescale texels x0..x1, y0..y1 of the window into light_scaled; a few texels
+        around them are scaled along so the filtering matches across the seams"""
+        k = LIGHTMAP_STRIP_OVERLAP
+        scaled = pygame.transform.smoothscale(
+            self.light_texels(x0 - k, y0 - k, x1 + k, y1 + k),
+            ((x1 - x0 + 2 * k) * texel, (y1 - y0 + 2 * k) * texel))
+        wx0, wy0 = self.light_window[:2]
+        self.light_scaled.blit(scaled, ((x0 - wx0) * texel, (y0 - wy0) * texel),
+                               (k * texel, k * texel, (x1 - x0) * texel, (y1 - y0) * texel))
+
+    def draw_lighting(self, surface, camera_x, camera_y, zoom=1, lights=()):
+        """Multiply the view by the static lighting plus the moving lights (x, y, radius, colour)"""
+        if self.ambient is None:
+            return
+        standing = sum(tower.state != State.DEAD for tower in self.towers)
+        if standing != self.lightmap_towers:
+            self.lightmap_towers = standing
+            self.bake_lightmap()
+
+        s = LIGHTMAP_SCALE
+        camera_x, camera_y = int(camera_x), int(camera_y)
+        left, top = camera_x // s, camera_y // s
+        right = (camera_x + int(surface.get_width() / zoom)) // s + 2
+        bottom = (camera_y + int(surface.get_height() / zoom)) // s + 2
+        # The window is sized for the screen, so panning only ever moves it
+        m = LIGHTMAP_WINDOW_MARGIN
+        cols = int(surface.get_width() / zoom) // s + 3 + 2 * m
+        rows = int(surface.get_height() / zoom) // s + 3 + 2 * m
+        window = self.light_window
+        if (window is None or zoom != self.light_zoom
+                or (window[2] - window[0], window[3] - window[1]) != (cols, rows)):
+            self.scale_light_window(left - m, top - m, left - m + cols, top - m + rows, zoom)
+        elif left < window[0] or top < window[1] or right > window[2] or bottom > window[3]:
+            self.move_light_window(left - m, top - m)
+        window = self.light_window
+
+        if self.light_buffer is None or self.light_buffer.get_size() != surface.get_size():
+            self.light_buffer = pygame.Surface(surface.get_size())
+        buffer = self.light_buffer
+        origin_x, origin_y = math.floor(camera_x * zoom), math.floor(camera_y * zoom)
+        buffer.blit(self.light_scaled, (int(window[0] * s * zoom) - origin_x,
+                                        int(window[1] * s * zoom) - origin_y))
+        stamps = []
+        for x, y, radius, colour in lights:
+            radius = max(1, int(radius * zoom))
+            stamps.append((light_stamp(radius, colour),
+                           (int(x * zoom) - origin_x - radius, int(y * zoom) - origin_y - radius),
+                           None, pygame.BLEND_ADD))
+        buffer.blits(stamps, False)
+        surface.blit(buffer, (0, 0), special_flags=pygame.BLEND_MULT)
+
+    def get_minimap(self):
+        """Map thumbnail and its scale: every tile in the average colour of its
+        top-most image, with the teleports outlined"""
+        if self.minimap is not None:
+            return self.minimap
+        colours = self.tile_colours[:, :3]
+        # Mostly transparent tiles let the layer below show through
+        coloured = self.tile_colours[:, 3] >= 64
+        pixels = np.zeros((self.height, self.width, 3), dtype=np.uint8)
+        for gids in self.tile_layers:
+            mask = coloured[gids]
+            pixels[mask] = colours[gids[mask]]
+        thumbnail = pygame.surfarray.make_surface(pixels.transpose(1, 0, 2))
+
+        map_w = self.width * self.tile_w
+        map_h = self.height * self.tile_h
+        scale = MINIMAP_SIZE / max(map_w, map_h)
+        size = (max(1, round(map_w * scale)), max(1, round(map_h * scale)))
+        if size[0] < self.width:
+            thumbnail = pygame.transform.smoothscale(thumbnail, size)
+        else:
+            thumbnail = pygame.transform.scale(thumbnail, size)
+        for tp in self.teleports:
+            rect = tp['rect']
+            pygame.draw.rect(thumbnail, (0, 255, 255),
+                             (int(rect.x * scale), int(rect.y * scale),
+                              max(2, int(rect.width * scale)), max(2, int(rect.height * scale))), 1)
+        self.minimap = (thumbnail.convert(), scale)
+        return self.minimap
+
+    def build_fog_overlay(self, tx0, ty0, tx1, ty1, zoom):
+        """Render the fog of tile window tx0..tx1, ty0..ty1 (exclusive) at zoom"""
+        self.fog_overlay = pygame.Surface(((tx1 - tx0) * int(self.tile_w * zoom),
+                                           (ty1 - ty0) * int(self.tile_h * zoom)), pygame.SRCALPHA)
+        self.fog_window = (tx0, ty0, tx1, ty1)
+        self.fog_zoom = zoom
+        self.paint_fog(tx0, ty0, tx1, ty1)
+
+    def move_fog_overlay(self, tx0, ty0):
+        """Move the fog window to start at tile (tx0, ty0): the overlay is scrolled
+        along and only the newly exposed tile strips are painted"""
+        wx0, wy0, wx1, wy1 = self.fog_window
+        dx, dy = tx0 - wx0, ty0 - wy0
+        cols, rows = wx1 - wx0, wy1 - wy0
+        if abs(dx) >= cols or abs(dy) >= rows:
+            self.build_fog_overlay(tx0, ty0, tx0 + cols, ty0 + rows, self.fog_zoom)
+            return
+        self.fog_overlay.scroll(-dx * int(self.tile_w * self.fog_zoom),
+                                -dy * int(self.tile_h * self.fog_zoom))
+        tx1, ty1 = tx0 + cols, ty0 + rows
+        self.fog_window = (tx0, ty0, tx1, ty1)
+        if dx:
+            self.paint_fog(tx1 - dx if dx > 0 else tx0, ty0, tx1 if dx > 0 else tx0 - dx, ty1)
+        if dy:
+            self.paint_fog(tx0, ty1 - dy if dy > 0 else ty0, tx1, ty1 if dy > 0 else ty0 - dy)
+
+    def paint_fog(self, tx0, ty0, tx1, ty1):
+        """Repaint tiles tx0..tx1, ty0..ty1 (exclusive) of the fog overlay from explored;
+        tiles outside the map get no fog"""
+        alpha = np.zeros((ty1 - ty0, tx1 - tx0), dtype=np.uint8)
+        x0, y0 = max(tx0, 0), max(ty0, 0)
+        x1, y1 = min(tx1, self.width), min(ty1, self.height)
+        if x0 < x1 and y0 < y1:
+            alpha[y0 - ty0:y1 - ty0, x0 - tx0:x1 - tx0] = np.where(
+                self.explored[y0:y1, x0:x1], 0, FOG_ALPHA)
+        # One pixel per tile, scaled up to tile size straight into the overlay
+        small = pygame.Surface((tx1 - tx0, ty1 - ty0), pygame.SRCALPHA)
+        small.fill((0, 0, 0, 255))
+        pixels = pygame.surfarray.pixels_alpha(small)
+        pixels[:] = alpha.T
+        del pixels
+        tile_w = int(self.tile_w * self.fog_zoom)
+        tile_h = int(self.tile_h * self.fog_zoom)
+        wx0, wy0 = self.fog_window[:2]
+        area = pygame.Rect((tx0 - wx0) * tile_w, (ty0 - wy0) * tile_h,
+                           (tx1 - tx0) * tile_w, (ty1 - ty0) * tile_h)
+        pygame.transform.scale(small, area.size, self.fog_overlay.subsurface(area))
+
+    def view_tiles(self, surface, camera_x, camera_y, zoom):
+        """Tile window tx0, ty0, tx1, ty1 (exclusive) covering surface at this camera"""
+        tile_w = int(self.tile_w * zoom)
+        tile_h = int(self.tile_h * zoom)
+        origin_x = math.floor(int(camera_x) * zoom)
+        origin_y = math.floor(int(camera_y) * zoom)
+        return (origin_x // tile_w, origin_y // tile_h,
+                min(self.width, (origin_x + surface.get_width()) // tile_w + 1),
+                min(self.height, (origin_y + surface.get_height()) // tile_h + 1))
+
+    def fog_in_view(self, surface, camera_x, camera_y, zoom=1):
+        """True if draw_fog would darken any part of surface"""
+        if not self.fog:
+            return False
+        tx0, ty0, tx1, ty1 = self.view_tiles(surface, camera_x, camera_y, zoom)
+        return not self.explored[ty0:ty1, tx0:tx1].all()
+
+    def draw_fog(self, surface, camera_x, camera_y, zoom=1):
+        """Darken the unexplored tiles in view with the cached fog overlay"""
+        if not self.fog_in_view(surface, camera_x, camera_y, zoom):
+            return
+        tile_w = int(self.tile_w * zoom)
+        tile_h = int(self.tile_h * zoom)
+        origin_x = math.floor(int(camera_x) * zoom)
+        origin_y = math.floor(int(camera_y) * zoom)
+        tx0, ty0, tx1, ty1 = self.view_tiles(surface, camera_x, camera_y, zoom)
+
+        # The window is sized for the screen, so panning only ever moves it
+        m = FOG_OVERLAY_MARGIN
+        cols = surface.get_width() // tile_w + 2 + 2 * m
+        rows = surface.get_height() // tile_h + 2 + 2 * m
+        window = self.fog_window
+        if (self.fog_overlay is None or zoom != self.fog_zoom
+                or (window[2] - window[0], window[3] - window[1]) != (cols, rows)):
+            self.build_fog_overlay(tx0 - m, ty0 - m, tx0 - m + cols, ty0 - m + rows, zoom)
+        elif tx0 < window[0] or ty0 < window[1] or tx1 > window[2] or ty1 > window[3]:
+            self.move_fog_overlay(tx0 - m, ty0 - m)
+        window = self.fog_window
+        surface.blit(self.fog_overlay, (window[0] * tile_w - origin_x,
+                                        window[1] * tile_h - origin_y))
+
+
+class MapCache:
+    """Bounded LRU cache of constructed GameMap instances, keyed by TMX path"""
+
+    def __init__(self, max_entries=4, max_bytes=None):
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max_bytes
+        self.maps = OrderedDict()
+        self.active_key = None
+        self.hits = 0
+        self.misses = 0
+        # MapPreloader adds maps from its worker thread
+        self.lock = threading.Lock()
+
+    def __contains__(self, tmx_file):
+        with self.lock:
+            return os.path.abspath(tmx_file) in self.maps
+
+    def load(self, tmx_file):
+        """Return the map for tmx_file, building it only on a cache miss"""
+        key = os.path.abspath(tmx_file)
+        with self.lock:
+            game_map = self.maps.get(key)
+            if game_map is not None:
+                self.hits += 1
+                self.maps.move_to_end(key)
+                self.active_key = key
+                self.evict()
+        if game_map is not None:
+            # Enemies and NPCs start fresh on every visit, like a newly loaded map
+            game_map.spawn_entities()
+            return game_map
+
+        game_map = GameMap(tmx_file)
+        with self.lock:
+            self.misses += 1
+            self.maps[key] = game_map
+            self.active_key = key
+            self.evict()
+        return game_map
+
+    def add(self, tmx_file, game_map):
+        """Store a map built elsewhere (e.g. by MapPreloader) without counting a hit or miss.
+
+        Only the entry budget is enforced here: measuring bytes walks the chunk
+        dicts of the active map, which only the main thread may do. The next
+        load() brings the cache back under max_bytes."""
+        with self.lock:
+            self.maps[os.path.abspath(tmx_file)] = game_map
+            self.evict(check_bytes=False)
+
+    def total_bytes(self):
+        return sum(game_map.memory_footprint() for game_map in self.maps.values())
+
+    def evict(self, check_bytes=True):
+        """Drop least recently used maps until the budgets are met; never the active map.
+        Tilesets no remaining map uses are released from TILESET_CACHE."""
+        def over_budget():
+            if len(self.maps) > self.max_entries:
+                return True
+            return check_bytes and self.max_bytes is not None and self.total_bytes() > self.max_bytes
+
+        evicted = False
+        while len(self.maps) > 1 and over_budget():
+            victim = next((key for key in self.maps if key != self.active_key), None)
+            if victim is None:
+                break
+            del self.maps[victim]
+            evicted = True
+        if evicted:
+            TILESET_CACHE.retain(set().union(*(game_map.tileset_paths
+                                               for game_map in self.maps.values())))
+
+    def stats(self):
+        return f"{len(self.maps)} maps, {self.hits} hits, {self.misses} misses"
+
+
+class MapPreloader:
+    """Worker thread that builds teleport destination maps into a MapCache ahead of time"""
+
+    def __init__(self, map_cache):
+        self.map_cache = map_cache
+        self.queue = queue.Queue()
+        self.pending = set()
+        self.failed = set()  # not retried in the background; load_map reports the error
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def request(self, tmx_file):
+        """Queue tmx_file for loading unless it is cached or already queued"""
+        key = os.path.abspath(tmx_file)
+        if tmx_file in self.map_cache:
+            return
+        with self.lock:
+            if key in self.pending or key in self.failed:
+                return
+            self.pending.add(key)
+        self.queue.put(key)
+
+    def is_pending(self, tmx_file):
+        with self.lock:
+            return os.path.abspath(tmx_file) in self.pending
+
+    def run(self):
+        while True:
+            key = self.queue.get()
+            if key is None:
+                break
+            try:
+                game_map = None if key in self.map_cache else GameMap(key)
+            except Exception as e:
+                print(f"Preloading {os.path.basename(key)} failed: {e}")
+                with self.lock:
+                    self.failed.add(key)
+            else:
+                if game_map is not None:
+                    self.map_cache.add(key, game_map)
+                    print(f"Preloaded map: {os.path.basename(key)}")
+            finally:
+                with self.lock:
+                    self.pending.discard(key)
+
+    def stop(self):
+        self.queue.put(None)
+
+
+def merge_rects(rects):
+    """Union overlapping rects until none of them overlap"""
+    merged = []
+    for rect in rects:
+        rect = pygame.Rect(rect)
+        hit = rect.collidelist(merged)
+        while hit != -1:
+            rect.union_ip(merged.pop(hit))
+            hit = rect.collidelist(merged)
+        merged.append(rect)
+    return merged
 
 
 def draw_ui_bar(surface, x, y, w, h, value, max_value, color, bg_color, label):
-    font = pygame.font.Font(None, 20)
-    label_surf = font.render(label, True, (255, 255, 255))
-    surface.blit(label_surf, (x, y - 18))
-    pygame.draw.rect(surface, bg_color, (x, y, w, h))
+    label_surf = render_text(label, 20, (255, 255, 255))
+    rect = surface.blit(label_surf, (x, y - 18))
+    rect.union_ip(pygame.draw.rect(surface, bg_color, (x, y, w, h)))
     fill_w = int((value / max_value) * w)
     pygame.draw.rect(surface, color, (x, y, fill_w, h))
     pygame.draw.rect(surface, (0, 0, 0), (x, y, w, h), 2)
-    text = font.render(f"{int(value)}/{int(max_value)}", True, (255, 255, 255))
+    text = render_text(f"{int(value)}/{int(max_value)}", 20, (255, 255, 255))
     text_rect = text.get_rect(center=(x + w//2, y + h//2))
-    surface.blit(text, text_rect)
+    rect.union_ip(surface.blit(text, text_rect))
+    return rect
+
+
+def ui_bar_state(value, max_value, w):
+    """What draw_ui_bar shows for value: the numbers and the fill width"""
+    return int(value), int(max_value), int((value / max_value) * w)
+
+
+class HudLayer:
+    """Transparent screen-sized layer the HUD widgets are painted on. A widget is
+    repainted only when the values it shows change (together with the widgets it
+    overlaps, so they stay stacked in order); otherwise the layer is just blitted."""
+
+    def __init__(self, size):
+        self.surface = pygame.Surface(size, pygame.SRCALPHA)
+        self.values = {}
+        self.painters = {}
+        self.rects = {}
+        self.changed = set()
+
+    def widget(self, name, values, paint, *args):
+        """Show widget name; paint(surface, *args) draws it and returns its Rect
+        (or None), and is only called when values differ from last time"""
+        if self.values.get(name, self) != values:
+            self.values[name] = values
+            self.painters[name] = (paint, args)
+            self.changed.add(name)
+
+    def repaint(self):
+        """Repaint the changed widgets and every widget stacked on or under them"""
+        group = self.changed
+        while True:
+            areas = merge_rects(self.rects[name] for name in group if name in self.rects)
+            overlapping = {name for name, rect in self.rects.items()
+                           if name not in group and rect.collidelist(areas) != -1}
+            if overlapping:
+                group |= overlapping
+                continue
+
+            for rect in areas:
+                self.surface.fill((0, 0, 0, 0), rect)
+            for name, (paint, args) in self.painters.items():
+                if name in group:
+                    rect = paint(self.surface, *args)
+                    if rect:
+                        self.rects[name] = rect.clip(self.surface.get_rect())
+                    else:
+                        self.rects.pop(name, None)
+            # a widget that grew may now cover one outside the group
+            areas = [self.rects[name] for name in group if name in self.rects]
+            if not any(name not in group and rect.collidelist(areas) != -1
+                       for name, rect in self.rects.items()):
+                break
+        self.changed = set()
+
+    def draw(self, surface):
+        """Blit the painted part of the layer onto surface; returns the Rects covered"""
+        if self.changed:
+            self.repaint()
+        rects = merge_rects(self.rects.values())
+        surface.blits([(self.surface, rect, rect) for rect in rects], False)
+        return rects
+
+
+def draw_centered_text(surface, text, size, colour, y):
+    """text centred horizontally on surface at height y; returns its Rect"""
+    text_surf = render_text(text, size, colour)
+    return surface.blit(text_surf, (surface.get_width() // 2 - text_surf.get_width() // 2, y))
 
 
 def spawn_slimes_randomly(map_obj, count=5):
-    """Spawn slimes in random non-collision areas"""
+    """Spawn slimes on random free 2x2 tile spots (inside spawn zones if the map has any)"""
     slimes = []
-    collision_rects = map_obj.collision_rects
 
     for _ in range(count):
+        tile = map_obj.random_spawn_tile(2, 2)
+        if tile is None:
+            print("No free tiles to spawn slimes on")
+            break
         slime_type = random.choice(['red_slime', 'blue_slime', 'yellow_slime'])
-        max_attempts = 50
-
-        for attempt in range(max_attempts):
-            x = random.randint(5, map_obj.width - 5) * map_obj.tile_w
-            y = random.randint(5, map_obj.height - 5) * map_obj.tile_h
-
-            test_rect = pygame.Rect(
-                x, y, map_obj.tile_w * 2, map_obj.tile_h * 2)
-            if not any(test_rect.colliderect(r) for r in collision_rects):
-                slime = Slime(x, y, map_obj.tile_w, map_obj.tile_h, slime_type)
-                slimes.append(slime)
-                break
+        slimes.append(Slime(tile[0] * map_obj.tile_w, tile[1] * map_obj.tile_h,
+                            map_obj.tile_w, map_obj.tile_h, slime_type))
 
     return slimes
 
 
 class Game:
-    def __init__(self, tmx_file, fullscreen=True, player_name="Player"):
+    def __init__(self, tmx_file, fullscreen=True, player_name="Player",
+                 map_cache_size=4, map_cache_bytes=None, preload_distance=None, dirty_rects=False):
         pygame.init()
         pygame.mixer.init()
 
@@ -1507,8 +3060,15 @@ class Game:
         self.clock = pygame.time.Clock()
         self.running = True
 
-        self.game_map = GameMap(tmx_file)
+        self.map_cache = MapCache(map_cache_size, map_cache_bytes)
+        self.game_map = self.map_cache.load(tmx_file)
         self.current_map = tmx_file
+
+        # Teleport destinations load in the background: all of them as soon as a
+        # map is active, or only those within preload_distance pixels of the player
+        self.map_preloader = MapPreloader(self.map_cache)
+        self.preload_distance = preload_distance
+        self.pending_teleport = None
         self.debug_draw_teleports = False
 
         self.player = Player(166, 57, self.game_map.tile_w,
@@ -1533,7 +3093,6 @@ class Game:
                              self.game_map.width * self.game_map.tile_w,
                              self.game_map.height * self.game_map.tile_h)
 
-        self.font = pygame.font.Font(None, 24)
         self.message = ""
         self.message_timer = 0
 
@@ -1543,8 +3102,24 @@ class Game:
         self.load_music(tmx_file)
 
         self.nearby_npc = None
+        self.show_minimap = True
+        self.hud = None
+
+        # Dirty-rect rendering: while the map background is unchanged, only the
+        # areas drawn last frame and this frame are redrawn and pushed to the display
+        self.dirty_rects = dirty_rects
+        self.dirty = []
+        self.frame_state = None
+
+        # The map as seen by the camera; panning scrolls it instead of redrawing it
+        self.background = None
+        self.background_state = None
+        self.background_origin = (0, 0)
+        # World rects of animated tiles that changed frame since the background was drawn
+        self.animated_tiles = []
 
         self.start_intro_dialogue()
+        self.preload_teleport_destinations()
 
     def start_intro_dialogue(self):
         intro_dialogues = [
@@ -1630,14 +3205,57 @@ class Game:
         except Exception as e:
             print(f"Could not load music: {e}")
 
+    def resolve_teleport_dest(self, tp):
+        """Absolute path of a teleport's destination map, or None if it cannot be found"""
+        dest = tp.get('dest')
+        if not dest:
+            return None
+        base_dir = os.path.dirname(os.path.abspath(
+            self.current_map)) if self.current_map else os.path.dirname(os.path.abspath(__file__))
+        dest_path = dest if os.path.isabs(
+            dest) else os.path.join(base_dir, dest)
+        if not os.path.exists(dest_path):
+            alt = os.path.join(os.path.dirname(
+                os.path.abspath(__file__)), 'map', dest)
+            if os.path.exists(alt):
+                dest_path = alt
+        return dest_path if os.path.exists(dest_path) else None
+
+    def preload_teleport_destinations(self):
+        """Hand teleport destinations of the current map to the background preloader"""
+        if self.preload_distance is None:
+            near = None
+        else:
+            near = pygame.Rect(self.player.pixel_x, self.player.pixel_y,
+                               self.player.tile_w, self.player.tile_h).inflate(
+                self.preload_distance * 2, self.preload_distance * 2)
+
+        teleports = self.game_map.teleports if near is None else self.game_map.triggers_at(near, 'teleport')
+        for tp in teleports:
+            dest_path = self.resolve_teleport_dest(tp)
+            if dest_path:
+                self.map_preloader.request(dest_path)
+
+    def request_teleport(self, dest_path, tp):
+        """Teleport now if the destination is ready, otherwise once the preloader finishes it"""
+        if self.map_preloader.is_pending(dest_path):
+            self.pending_teleport = (dest_path, tp)
+            self.message = "Loading..."
+            self.message_timer = 30
+            return
+        self.load_map(dest_path, tp)
+        self.teleport_cooldown = 30
+
     def load_map(self, tmx_file, teleport_obj=None):
         try:
-            new_map = GameMap(tmx_file)
+            new_map = self.map_cache.load(tmx_file)
         except Exception as e:
             self.message = f"Failed to load map: {os.path.basename(tmx_file)}"
             self.message_timer = 60
             print(f"load_map error: {e}")
             return
+        print(f"Map cache: {self.map_cache.stats()}")
+        print(f"Tileset cache: {TILESET_CACHE.stats()}")
 
         self.game_map = new_map
         self.current_map = tmx_file
@@ -1718,6 +3336,7 @@ class Game:
             pass
 
         self.load_music(tmx_file)
+        self.preload_teleport_destinations()
 
     def toggle_fullscreen(self):
         self.fullscreen = not self.fullscreen
@@ -1732,6 +3351,16 @@ class Game:
                 (self.screen_width, self.screen_height))
         self.camera.update_screen_size(self.screen_width, self.screen_height)
 
+    def change_zoom(self, step):
+        """Move step entries up or down ZOOM_LEVELS"""
+        index = ZOOM_LEVELS.index(self.camera.zoom) + step
+        if 0 <= index < len(ZOOM_LEVELS):
+            self.camera.zoom = ZOOM_LEVELS[index]
+            self.camera.update(self.player.pixel_x, self.player.pixel_y,
+                               self.player.tile_w, self.player.tile_h)
+            self.message = f"Zoom {ZOOM_LEVELS[index]}x"
+            self.message_timer = 30
+
     def handle_events(self):
         self.teleport_ready = None
         for event in pygame.event.get():
@@ -1740,9 +3369,8 @@ class Game:
             elif event.type == pygame.MOUSEBUTTONDOWN:
                 if event.button == 1:
                     if not self.dialogue.active:
-                        mouse_x, mouse_y = pygame.mouse.get_pos()
-                        world_x = mouse_x + self.camera.x
-                        world_y = mouse_y + self.camera.y
+                        world_x, world_y = self.camera.screen_to_world(
+                            *pygame.mouse.get_pos())
                         projectile, is_crit = self.player.shoot_projectile(
                             world_x, world_y)
                         if projectile:
@@ -1763,6 +3391,12 @@ class Game:
                     return
                 if event.key == pygame.K_F11 or (event.key == pygame.K_RETURN and (pygame.key.get_mods() & pygame.KMOD_ALT)):
                     self.toggle_fullscreen()
+                elif event.key in (pygame.K_EQUALS, pygame.K_PLUS, pygame.K_KP_PLUS):
+                    self.change_zoom(1)
+                elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                    self.change_zoom(-1)
+                elif event.key == pygame.K_m:
+                    self.show_minimap = not self.show_minimap
                 elif event.key == pygame.K_ESCAPE:
                     if self.fullscreen:
                         self.toggle_fullscreen()
@@ -1795,48 +3429,53 @@ class Game:
                         # Check for teleport
                         p_rect = pygame.Rect(self.player.pixel_x, self.player.pixel_y,
                                              self.player.tile_w, self.player.tile_h)
-                        for tp in getattr(self.game_map, 'teleports', []):
-                            if tp.get('rect') and p_rect.colliderect(tp['rect']):
-                                dest = tp.get('dest')
-                                if dest:
-                                    base_dir = os.path.dirname(os.path.abspath(
-                                        self.current_map)) if self.current_map else os.path.dirname(os.path.abspath(__file__))
-                                    dest_path = dest if os.path.isabs(
-                                        dest) else os.path.join(base_dir, dest)
-                                    if not os.path.exists(dest_path):
-                                        alt = os.path.join(os.path.dirname(
-                                            os.path.abspath(__file__)), 'map', dest)
-                                        if os.path.exists(alt):
-                                            dest_path = alt
-                                    if os.path.exists(dest_path):
-                                        self.load_map(dest_path, tp)
-                                        self.teleport_cooldown = 30
-                                        break
+                        for tp in self.game_map.triggers_at(p_rect, 'teleport'):
+                            dest_path = self.resolve_teleport_dest(tp)
+                            if dest_path:
+                                self.request_teleport(dest_path, tp)
+                                break
 
     def update(self):
+        if self.pending_teleport and not self.map_preloader.is_pending(self.pending_teleport[0]):
+            dest_path, tp = self.pending_teleport
+            self.pending_teleport = None
+            self.load_map(dest_path, tp)
+            self.teleport_cooldown = 30
+        elif self.preload_distance is not None:
+            self.preload_teleport_destinations()
+
         keys = pygame.key.get_pressed()
-        self.player.handle_input(keys, self.game_map.collision_rects,
-                                 self.game_map.width, self.game_map.height)
+        self.player.handle_input(keys, self.game_map)
 
         self.player.update_combat()
 
+        self.game_map.reveal(self.player.pixel_x + self.player.tile_w / 2,
+                             self.player.pixel_y + self.player.tile_h / 2)
+
+        # Every map runs its tile animations off the same clock
+        self.animated_tiles += self.game_map.update_animations(pygame.time.get_ticks())
+
+        # One shared path field towards the player for every chasing slime
+        if self.slimes:
+            self.game_map.update_flow_field(self.player.pixel_x + self.player.tile_w / 2,
+                                            self.player.pixel_y + self.player.tile_h / 2)
         for slime in self.slimes:
-            slime.update(self.player, self.game_map.collision_rects,
-                         self.game_map.width, self.game_map.height, self)
+            slime.update(self.player, self.game_map, self)
 
         for boss in self.bosses:
-            projectile = boss.update(self.player)
+            projectile = boss.update(self.player, self.game_map)
             if projectile:
                 self.projectiles.append(projectile)
 
         for tower in self.towers:
-            projectile = tower.update(self.player)
+            projectile = tower.update(self.player, self.game_map)
             if projectile:
                 self.projectiles.append(projectile)
 
         # Check for nearby NPCs
         self.nearby_npc = None
-        for npc in self.npcs:
+        player_point = pygame.Rect(int(self.player.pixel_x), int(self.player.pixel_y), 1, 1)
+        for npc in self.game_map.triggers_at(player_point, 'npc'):
             if npc.can_interact(self.player):
                 self.nearby_npc = npc
                 break
@@ -1844,7 +3483,9 @@ class Game:
         for proj in self.projectiles[:]:
             proj.update()
 
-            if proj.is_enemy:
+            if proj.check_collision(self.game_map):
+                proj.active = False
+            elif proj.is_enemy:
                 player_rect = pygame.Rect(self.player.pixel_x, self.player.pixel_y,
                                           self.player.tile_w, self.player.tile_h)
                 if proj.rect.colliderect(player_rect) and self.player.state != State.DEAD:
@@ -1925,6 +3566,7 @@ class Game:
 
         self.camera.update(self.player.pixel_x, self.player.pixel_y,
                            self.player.tile_w, self.player.tile_h)
+        self.game_map.stream_chunks(self.player.pixel_x, self.player.pixel_y)
 
         self.teleport_ready = None
         if getattr(self, 'teleport_cooldown', 0) > 0:
@@ -1932,10 +3574,9 @@ class Game:
         else:
             p_rect = pygame.Rect(self.player.pixel_x, self.player.pixel_y,
                                  self.player.tile_w, self.player.tile_h)
-            for tp in getattr(self.game_map, 'teleports', []):
-                if tp.get('rect') and p_rect.colliderect(tp['rect']):
-                    self.teleport_ready = tp
-                    break
+            for tp in self.game_map.triggers_at(p_rect, 'teleport'):
+                self.teleport_ready = tp
+                break
 
         if self.message_timer > 0:
             self.message_timer -= 1
@@ -1956,125 +3597,232 @@ class Game:
             if self.teleport_marker_timer == 0:
                 self.teleport_marker_rect = None
 
-    def draw(self):
-        self.screen.fill((0, 0, 0))
-        self.game_map.draw(self.screen, self.camera.x, self.camera.y)
-
-        for npc in self.npcs:
-            npc.draw(self.screen, self.camera.x, self.camera.y)
-
-        for slime in self.slimes:
-            slime.draw(self.screen, self.camera.x, self.camera.y)
-
-        for boss in self.bosses:
-            boss.draw(self.screen, self.camera.x, self.camera.y)
+    def draw_minimap(self):
+        """Cached map thumbnail in the top-right corner, with this frame's markers"""
+        thumbnail, scale = self.game_map.get_minimap()
+        width, height = thumbnail.get_size()
+        x = self.screen_width - width - MINIMAP_MARGIN
+        y = MINIMAP_MARGIN
+        self.screen.blit(thumbnail, (x, y))
+        rect = pygame.draw.rect(self.screen, (255, 255, 255), (x - 1, y - 1, width + 2, height + 2), 1)
+
+        view_w, view_h = self.camera.view_size()
+        pygame.draw.rect(self.screen, (255, 255, 255),
+                         (x + int(self.camera.x * scale), y + int(self.camera.y * scale),
+                          max(2, int(view_w * scale)), max(2, int(view_h * scale))), 1)
+        markers = [(slime.pixel_x, slime.pixel_y, (255, 60, 60), 2)
+                   for slime in self.slimes if slime.state != State.DEAD]
+        markers += [(tower.pixel_x + tower.render_w / 2, tower.pixel_y + tower.render_h / 2,
+                     (255, 160, 0), 3) for tower in self.towers if tower.state != State.DEAD]
+        markers += [(boss.pixel_x + boss.render_w / 2, boss.pixel_y + boss.render_h / 2,
+                     (200, 60, 255), 4) for boss in self.bosses if boss.state != State.DEAD]
+        markers.append((self.player.pixel_x + self.player.tile_w / 2,
+                        self.player.pixel_y + self.player.tile_h / 2, (60, 255, 60), 3))
+        for marker_x, marker_y, colour, size in markers:
+            self.screen.fill(colour, (x + int(marker_x * scale) - size // 2,
+                                      y + int(marker_y * scale) - size // 2, size, size))
+        return rect.inflate(4, 4)
+
+    def update_background(self):
+        """Bring the map background up to date with the camera; returns True if it changed.
+
+        When the camera pans by less than a screen, last frame's pixels are
+        scrolled along and only the newly exposed edge strips are drawn. Animated
+        tiles that changed frame in view are redrawn in place and added to self.dirty."""
+        zoom = self.camera.zoom
+        size = self.screen.get_size()
+        state = (self.game_map, zoom, size)
+        # Map pixels only depend on the camera position in zoomed pixels
+        origin = (math.floor(self.camera.x * zoom), math.floor(self.camera.y * zoom))
+        if self.background is None or self.background.get_size() != size:
+            self.background = pygame.Surface(size)
+            self.background_state = None
+
+        animated, self.animated_tiles = self.animated_tiles, []
+        if state == self.background_state:
+            dx = origin[0] - self.background_origin[0]
+            dy = origin[1] - self.background_origin[1]
+            if abs(dx) < size[0] and abs(dy) < size[1]:
+                strips = []
+                if dx or dy:
+                    self.background.scroll(-dx, -dy)
+                if dx:
+                    strips.append(pygame.Rect(size[0] - dx if dx > 0 else 0, 0, abs(dx), size[1]))
+                if dy:
+                    strips.append(pygame.Rect(0, size[1] - dy if dy > 0 else 0, size[0], abs(dy)))
+                view = self.background.get_rect()
+                tiles = [rect for rect in (pygame.Rect(math.floor(r.x * zoom) - origin[0],
+                                                       math.floor(r.y * zoom) - origin[1],
+                                                       math.ceil(r.w * zoom) + 1,
+                                                       math.ceil(r.h * zoom) + 1).clip(view)
+                                           for r in animated) if rect]
+                for rect in strips + tiles:
+                    self.background.set_clip(rect)
+                    self.background.fill((0, 0, 0))
+                    self.game_map.draw(self.background, self.camera.x, self.camera.y, zoom)
+                self.background.set_clip(None)
+                self.background_origin = origin
+                if strips:
+                    return True
+                self.dirty += tiles
+                return False
+
+        self.background.fill((0, 0, 0))
+        self.game_map.draw(self.background, self.camera.x, self.camera.y, zoom)
+        self.background_state = state
+        self.background_origin = origin
+        return True
+
+    def restore_background(self, rects):
+        for rect in rects:
+            self.screen.blit(self.background, rect, rect)
 
-        for tower in self.towers:
-            tower.draw(self.screen, self.camera.x, self.camera.y)
-
-        self.player.draw(self.screen, self.camera.x, self.camera.y)
+    def draw(self):
+        zoom = self.camera.zoom
+        changed = self.update_background()
+        # Fog and lighting are drawn over the sprites, so any change to them means a full redraw
+        frame_state = (self.game_map, self.game_map.fog_version)
+        if (self.dirty_rects and not changed and self.game_map.ambient is None
+                and frame_state == self.frame_state):
+            pygame.display.update(self.draw_dirty(zoom))
+            return
+        self.frame_state = frame_state
 
-        for proj in self.projectiles:
-            proj.draw(self.screen, self.camera.x, self.camera.y)
+        self.screen.blit(self.background, (0, 0))
+        drawn = self.draw_world(zoom)
+        self.game_map.draw_fog(self.screen, self.camera.x, self.camera.y, zoom)
+        self.dirty = drawn + self.draw_hud(zoom)
+        pygame.display.flip()
 
-        for text in self.floating_texts:
-            text.draw(self.screen, self.camera.x, self.camera.y)
+    def draw_dirty(self, zoom):
+        """Redraw only where sprites and HUD were last frame and are now, over the
+        saved map background; returns the screen areas that changed"""
+        old = self.dirty
+        self.restore_background(old)
+        drawn = self.draw_world(zoom)
+        if self.game_map.fog_in_view(self.screen, self.camera.x, self.camera.y, zoom):
+            # Fog has to go over bare map plus sprites exactly once, so redraw the
+            # sprites on clean background in non-overlapping areas, then fog those
+            old = merge_rects(old + drawn)
+            self.restore_background(old)
+            drawn = self.draw_world(zoom)
+            clip = self.screen.get_clip()
+            for rect in old:
+                self.screen.set_clip(rect)
+                self.game_map.draw_fog(self.screen, self.camera.x, self.camera.y, zoom)
+            self.screen.set_clip(clip)
+        self.dirty = drawn + self.draw_hud(zoom)
+        return old + self.dirty
+
+    def draw_world(self, zoom):
+        """Draw the entities, lights and floating texts; returns the screen areas drawn"""
+        rects = [npc.draw(self.screen, self.camera.x, self.camera.y, zoom) for npc in self.npcs]
+        rects += [slime.draw(self.screen, self.camera.x, self.camera.y, zoom) for slime in self.slimes]
+        rects += [boss.draw(self.screen, self.camera.x, self.camera.y, zoom) for boss in self.bosses]
+        rects += [tower.draw(self.screen, self.camera.x, self.camera.y, zoom) for tower in self.towers]
+        rects.append(self.player.draw(self.screen, self.camera.x, self.camera.y, zoom))
+        rects += [proj.draw(self.screen, self.camera.x, self.camera.y, zoom) for proj in self.projectiles]
+
+        if self.game_map.ambient is not None:
+            lights = [(self.player.pixel_x + self.player.tile_w / 2,
+                       self.player.pixel_y + self.player.tile_h / 2) + PLAYER_LIGHT]
+            lights += [(proj.x, proj.y, PROJECTILE_LIGHT_RADIUS,
+                        LIGHT_COLOURS.get(proj.projectile_type, LIGHT_COLOURS['default']))
+                       for proj in self.projectiles]
+            self.game_map.draw_lighting(self.screen, self.camera.x, self.camera.y, zoom, lights)
+
+        rects += [text.draw(self.screen, self.camera.x, self.camera.y, zoom)
+                  for text in self.floating_texts]
+        return [rect for rect in rects if rect]
+
+    def draw_hud(self, zoom):
+        """Draw the markers, minimap, bars, prompts and dialogue; returns the screen areas drawn"""
+        rects = []
 
         if getattr(self, 'debug_draw_teleports', False):
             for tp in getattr(self.game_map, 'teleports', []):
                 try:
                     r = tp.get('rect')
                     if r:
-                        sx = r.x - self.camera.x
-                        sy = r.y - self.camera.y
-                        pygame.draw.rect(
-                            self.screen, (0, 255, 255), (sx, sy, r.width, r.height), 2)
-                        lbl = self.font.render(
-                            str(tp.get('dest')), True, (0, 255, 255))
-                        self.screen.blit(lbl, (sx, sy - 18))
+                        sx = (r.x - self.camera.x) * zoom
+                        sy = (r.y - self.camera.y) * zoom
+                        rects.append(pygame.draw.rect(
+                            self.screen, (0, 255, 255), (sx, sy, r.width * zoom, r.height * zoom), 2))
+                        lbl = render_text(str(tp.get('dest')), 24, (0, 255, 255))
+                        rects.append(self.screen.blit(lbl, (sx, sy - 18)))
                 except Exception:
                     pass
 
         if getattr(self, 'teleport_marker_rect', None) and getattr(self, 'teleport_marker_timer', 0) > 0:
             try:
                 tp = self.teleport_marker_rect
-                sx = int(tp.centerx - self.camera.x)
-                sy = int(tp.top - self.camera.y) - 24
+                sx = int((tp.centerx - self.camera.x) * zoom)
+                sy = int((tp.top - self.camera.y) * zoom) - 24
                 pulse = 1.0 + 0.2 * \
                     (1 + math.sin(self.teleport_marker_timer * 0.2))
                 arrow_h = int(16 * pulse)
                 arrow_w = int(12 * pulse)
                 points = [(sx, sy), (sx - arrow_w, sy + arrow_h),
                           (sx + arrow_w, sy + arrow_h)]
-                pygame.draw.polygon(self.screen, (255, 215, 0), points)
-                label = self.font.render("TELEPORT", True, (255, 215, 0))
-                self.screen.blit(label, (sx - label.get_width() // 2, sy - 18))
+                rects.append(pygame.draw.polygon(self.screen, (255, 215, 0), points))
+                label = render_text("TELEPORT", 24, (255, 215, 0))
+                rects.append(self.screen.blit(label, (sx - label.get_width() // 2, sy - 18)))
             except Exception:
                 pass
 
-        draw_ui_bar(self.screen, 10, 10, 200, 25, self.player.health,
-                    self.player.max_health, (46, 204, 113), (34, 139, 34), "Health")
-        draw_ui_bar(self.screen, 10, 50, 200, 20, self.player.stamina,
-                    self.player.max_stamina, (241, 196, 15), (150, 100, 0), "Stamina")
-
-        # Draw XP bar
-        draw_ui_bar(self.screen, 10, 85, 200, 15, self.player.xp,
-                    self.player.xp_to_next_level, (138, 43, 226), (75, 0, 130), "XP")
-
-        # Draw level indicator
-        level_font = pygame.font.Font(None, 28)
-        level_text = level_font.render(
-            f"Level {self.player.level}", True, (255, 255, 255))
-        level_bg = pygame.Surface(
-            (level_text.get_width() + 10, level_text.get_height() + 4))
-        level_bg.set_alpha(180)
-        level_bg.fill((0, 0, 0))
-        self.screen.blit(level_bg, (220, 10))
-        self.screen.blit(level_text, (225, 12))
-
-        # Draw stats info
-        stats_font = pygame.font.Font(None, 20)
-        stats_y = 40
-        stats_info = [
-            f"DMG: {int(self.player.attack_damage)}",
-            f"CRIT: {int(self.player.crit_chance * 100)}%"
-        ]
-        for stat_text in stats_info:
-            stat_surf = stats_font.render(stat_text, True, (200, 200, 200))
-            self.screen.blit(stat_surf, (225, stats_y))
-            stats_y += 20
-
-        controls = self.font.render(
-            "WASD: Move | SHIFT: Run | SPACE: Attack | LMB: Shoot | E: Interact/Teleport", True, (255, 255, 255))
-        self.screen.blit(controls, (10, self.screen_height - 30))
-
-        if getattr(self, 'teleport_ready', None):
-            prompt = self.font.render(
-                "Press E to teleport", True, (0, 255, 255))
-            self.screen.blit(prompt, (self.screen_width //
-                             2 - prompt.get_width() // 2, 70))
-
-        if self.nearby_npc and not self.dialogue.active:
-            prompt = self.font.render(
-                f"Press E to talk to {self.nearby_npc.npc_name}", True, (255, 255, 100))
-            self.screen.blit(prompt, (self.screen_width //
-                             2 - prompt.get_width() // 2, 90))
-
-        if self.message_timer > 0:
-            msg_surf = self.font.render(self.message, True, (255, 255, 0))
-            self.screen.blit(msg_surf, (self.screen_width //
-                             2 - msg_surf.get_width() // 2, 100))
-
-        if self.player.state == State.DEAD:
-            game_over_font = pygame.font.Font(None, 72)
-            game_over_surf = game_over_font.render(
-                "YOU DIED!", True, (255, 0, 0))
-            self.screen.blit(game_over_surf, (self.screen_width // 2 - game_over_surf.get_width() // 2,
-                                              self.screen_height // 2))
-
-        self.dialogue.draw(self.screen, self.screen_width, self.screen_height)
-
-        pygame.display.flip()
+        if self.show_minimap:
+            rects.append(self.draw_minimap())
+
+        hud = self.hud
+        if hud is None or hud.surface.get_size() != self.screen.get_size():
+            hud = self.hud = HudLayer(self.screen.get_size())
+
+        player = self.player
+        hud.widget('health', ui_bar_state(player.health, player.max_health, 200), draw_ui_bar,
+                   10, 10, 200, 25, player.health, player.max_health,
+                   (46, 204, 113), (34, 139, 34), "Health")
+        hud.widget('stamina', ui_bar_state(player.stamina, player.max_stamina, 200), draw_ui_bar,
+                   10, 50, 200, 20, player.stamina, player.max_stamina,
+                   (241, 196, 15), (150, 100, 0), "Stamina")
+        hud.widget('xp', ui_bar_state(player.xp, player.xp_to_next_level, 200), draw_ui_bar,
+                   10, 85, 200, 15, player.xp, player.xp_to_next_level,
+                   (138, 43, 226), (75, 0, 130), "XP")
+        hud.widget('level', player.level, self.paint_level, player.level)
+        stats = (int(player.attack_damage), int(player.crit_chance * 100))
+        hud.widget('stats', stats, self.paint_stats, *stats)
+        hud.widget('controls', None, lambda surface: surface.blit(render_text(
+            "WASD: Move | SHIFT: Run | SPACE: Attack | LMB: Shoot | E: Interact/Teleport | +/-: Zoom | M: Map",
+            24, (255, 255, 255)), (10, surface.get_height() - 30)))
+
+        teleport_ready = bool(getattr(self, 'teleport_ready', None))
+        hud.widget('teleport_prompt', teleport_ready, lambda surface: teleport_ready and draw_centered_text(
+            surface, "Press E to teleport", 24, (0, 255, 255), 70))
+        npc_name = self.nearby_npc.npc_name if self.nearby_npc and not self.dialogue.active else None
+        hud.widget('npc_prompt', npc_name, lambda surface: npc_name and draw_centered_text(
+            surface, f"Press E to talk to {npc_name}", 24, (255, 255, 100), 90))
+        message = self.message if self.message_timer > 0 else None
+        hud.widget('message', message, lambda surface: message and draw_centered_text(
+            surface, message, 24, (255, 255, 0), 100))
+        dead = player.state == State.DEAD
+        hud.widget('game_over', dead, lambda surface: dead and draw_centered_text(
+            surface, "YOU DIED!", 72, (255, 0, 0), surface.get_height() // 2))
+        rects += hud.draw(self.screen)
+
+        rects.append(self.dialogue.draw(self.screen, self.screen_width, self.screen_height))
+        return [rect for rect in rects if rect]
+
+    def paint_level(self, surface, level):
+        """Level badge of the HUD"""
+        level_text = render_text(f"Level {level}", 28, (255, 255, 255))
+        rect = surface.fill((0, 0, 0, 180), (220, 10, level_text.get_width() + 10,
+                                             level_text.get_height() + 4))
+        surface.blit(level_text, (225, 12))
+        return rect
+
+    def paint_stats(self, surface, damage, crit):
+        """DMG/CRIT lines of the HUD"""
+        rect = surface.blit(render_text(f"DMG: {damage}", 20, (200, 200, 200)), (225, 40))
+        return rect.union(surface.blit(render_text(f"CRIT: {crit}%", 20, (200, 200, 200)), (225, 60)))
 
     def run(self):
         while self.running:
@@ -2082,6 +3830,7 @@ class Game:
             self.update()
             self.draw()
             self.clock.tick(100)
+        self.map_preloader.stop()
         pygame.quit()
 
 
@@ -2147,12 +3896,15 @@ if __name__ == "__main__":
         sys.exit(1)
 
     start_fullscreen = False
+    dirty_rects = False
     player_name = "Player"  # Default нэр
     
     # Command line arguments унших
     for arg in sys.argv[1:]:
         if arg.lower() in ['fullscreen', '-f', '--fullscreen']:
             start_fullscreen = True
+        elif arg == '--dirty-rects':
+            dirty_rects = True
         elif arg.startswith('--player-name='):
             # Нэрийг decode хийх
             import urllib.parse
@@ -2161,7 +3913,8 @@ if __name__ == "__main__":
             print(f"Player name from Face ID: {player_name}")
 
     try:
-        game = Game(main_map_path, fullscreen=start_fullscreen, player_name=player_name)
+        game = Game(main_map_path, fullscreen=start_fullscreen, player_name=player_name,
+                    dirty_rects=dirty_rects)
         game.run()
     except Exception as e:
         print(f"\nError starting game: {e}")